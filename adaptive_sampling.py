@@ -0,0 +1,164 @@
+from skyfield.api import load, utc
+from datetime import timedelta
+from ephemeris_cache import cached_positions
+from tle_catalog import load_catalog
+from time_window import add_window_arguments, window_start, TIMESTAMP_FORMAT
+from visibility import itrs_to_geodetic
+from instrumentation import span, count
+import numpy as np
+import argparse
+import os
+
+# Position error allowed between the CZML samples and the propagated track;
+# unset keeps every generator on its fixed sampling grid
+DEFAULT_TOLERANCE_M = float(os.environ["SAT_CZML_TOLERANCE_M"]) if os.environ.get("SAT_CZML_TOLERANCE_M") else None
+DEFAULT_TRUTH_SECONDS = 10
+INTERPOLATION_DEGREE = 5
+
+def lagrange_interpolate(sample_t, sample_positions, t, degree=INTERPOLATION_DEGREE):
+    """
+    Positions at times t interpolated the way Cesium's SampledPositionProperty
+    evaluates LAGRANGE: degree + 1 samples starting degree // 2 + 1 before
+    the first sample after t, shifted inwards at either end of the track.
+    sample_positions has shape (sample, 3); t must lie within sample_t.
+    """
+    order = min(degree + 1, len(sample_t))
+    after = np.searchsorted(sample_t, t, side='right')
+    first = np.clip(after - degree // 2 - 1, 0, len(sample_t) - order)
+    window = first[:, None] + np.arange(order)
+    x = sample_t[window]
+    weights = np.ones_like(x)
+    for k in range(order):
+        for j in range(order):
+            if j != k:
+                weights[:, k] *= (t - x[:, j]) / (x[:, k] - x[:, j])
+    return np.einsum('ij,ijk->ik', weights, sample_positions[window])
+
+def interpolation_error(t, positions, indices, degree=INTERPOLATION_DEGREE):
+    """Distance (km) between the true positions at t and the interpolant through the samples at indices"""
+    estimate = lagrange_interpolate(t[indices], positions[indices], t, degree)
+    return np.linalg.norm(estimate - positions, axis=-1)
+
+def adaptive_indices(t, positions, tolerance_km, degree=INTERPOLATION_DEGREE):
+    """
+    Fewest-samples subset of a dense truth track (times t, positions of
+    shape (time, 3)) whose interpolant stays within tolerance_km of every
+    truth point. Sample intervals that exceed the tolerance are bisected
+    until none do, then samples whose removal keeps the local error in
+    bounds are dropped again. The first and last truth points are always
+    kept, so the sampled track spans the same interval.
+    Returns (indices into t, max error in km).
+    """
+    n = len(t)
+    stride = max(1, (n - 1) // (degree + 1))
+    indices = np.union1d(np.arange(0, n, stride), [n - 1])
+    while True:
+        error = interpolation_error(t, positions, indices, degree)
+        interval = np.searchsorted(indices, np.arange(n), side='right') - 1
+        bad = np.unique(interval[error > tolerance_km])
+        bad = bad[(bad < len(indices) - 1)]
+        bad = bad[indices[bad + 1] - indices[bad] > 1]
+        if not len(bad):
+            break
+        indices = np.union1d(indices, (indices[bad] + indices[bad + 1]) // 2)
+
+    # Bisection leaves power-of-two spacing; drop what the interpolant does not need
+    keep = list(indices)
+    a = 1
+    while a < len(keep) - 1 and len(keep) > degree + 1:
+        trial = np.array(keep[:a] + keep[a + 1:])
+        # Only truth points whose interpolation window can contain sample a change
+        local = slice(keep[max(a - degree - 1, 0)], keep[min(a + degree + 1, len(keep) - 1)] + 1)
+        estimate = lagrange_interpolate(t[trial], positions[trial], t[local], degree)
+        if np.linalg.norm(estimate - positions[local], axis=-1).max() <= tolerance_km:
+            keep.pop(a)
+        else:
+            a += 1
+    indices = np.array(keep)
+    return indices, float(np.nanmax(interpolation_error(t, positions, indices, degree), initial=0.0))
+
+def _utc(times):
+    return [d if d.tzinfo else d.replace(tzinfo=utc) for d in times]
+
+def truth_grid(times, truth_seconds=DEFAULT_TRUTH_SECONDS):
+    """
+    Seconds from times[0] of a dense check grid over the span of the fixed
+    sample times, plus the index of each fixed time in it
+    """
+    fixed = np.array([(d - times[0]).total_seconds() for d in times])
+    offsets = np.union1d(fixed, np.arange(0.0, fixed[-1], truth_seconds))
+    return offsets, np.searchsorted(offsets, fixed)
+
+def adaptive_report(tles, ts, times, tolerance_m, truth_seconds=DEFAULT_TRUTH_SECONDS):
+    """
+    Adaptive samples for every TLE over the span of the fixed grid `times`.
+    Returns (sample datetimes, ITRS positions) per satellite and rows of
+    (fixed samples, fixed-grid max error m, adaptive samples, adaptive max error m)
+    """
+    times = _utc(times)
+    offsets, fixed_index = truth_grid(times, truth_seconds)
+    truth_times = [times[0] + timedelta(seconds=float(x)) for x in offsets]
+    positions = cached_positions(list(tles), ts.from_datetimes(truth_times))
+
+    samples, rows = [], []
+    for track in positions:
+        indices, error = adaptive_indices(offsets, track, tolerance_m / 1000.0)
+        fixed_error = np.nanmax(interpolation_error(offsets, track, fixed_index), initial=0.0)
+        samples.append(([truth_times[i] for i in indices], track[indices]))
+        rows.append((len(fixed_index), fixed_error * 1000.0, len(indices), error * 1000.0))
+    return samples, rows
+
+def sample_tracks(tles, ts, times, tolerance_m=DEFAULT_TOLERANCE_M, truth_seconds=DEFAULT_TRUTH_SECONDS):
+    """
+    CZML position samples for each TLE: (timestamps, lon, lat, height km)
+    on the fixed grid `times`, or, with a tolerance, on the fewest times
+    that keep the degree-5 LAGRANGE interpolant within tolerance_m of the
+    propagated track over the same span. The adaptive case prints the
+    achieved error and the sample reduction.
+    """
+    tles = list(tles)
+    if tolerance_m is None:
+        lon, lat, height = itrs_to_geodetic(cached_positions(tles, ts.from_datetimes(_utc(times))))
+        with span("strftime"):
+            timestamps = [d.strftime(TIMESTAMP_FORMAT) for d in times]
+        count("position samples emitted", len(tles) * len(times))
+        return [(timestamps, lon[s], lat[s], height[s]) for s in range(len(tles))]
+
+    samples, rows = adaptive_report(tles, ts, times, tolerance_m, truth_seconds)
+    fixed_count, fixed_error, adaptive_count, error = (np.array(column) for column in zip(*rows))
+    print(f"Adaptive sampling: {adaptive_count.sum()} samples instead of {fixed_count.sum()} "
+          f"({100.0 * (1 - adaptive_count.sum() / fixed_count.sum()):.0f}% fewer), max error "
+          f"{error.max():.1f} m for a {tolerance_m:g} m tolerance (fixed grid: {fixed_error.max():.1f} m)")
+
+    tracks = []
+    for sample_times, positions in samples:
+        lon, lat, height = itrs_to_geodetic(positions[None])
+        with span("strftime"):
+            timestamps = [d.strftime(TIMESTAMP_FORMAT) for d in sample_times]
+        tracks.append((timestamps, lon[0], lat[0], height[0]))
+    count("position samples emitted", int(adaptive_count.sum()))
+    return tracks
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fixed and error-bounded adaptive CZML sampling")
+    parser.add_argument("--tolerance-m", type=float, default=DEFAULT_TOLERANCE_M or 100.0,
+                        help="allowed interpolation error against the propagated track")
+    parser.add_argument("--truth-seconds", type=float, default=DEFAULT_TRUTH_SECONDS,
+                        help="spacing of the propagated track the error is checked on")
+    add_window_arguments(parser, hours=1.5, step_minutes=1)
+    args = parser.parse_args()
+
+    ts = load.timescale()
+    catalog = load_catalog(args.tle_file)
+    start_time = window_start(args)
+    steps = int(args.hours * 60 // args.step_minutes)
+    times = [start_time + timedelta(minutes=i * args.step_minutes) for i in range(steps)]
+    _, rows = adaptive_report(catalog.tles(), ts, times, args.tolerance_m, args.truth_seconds)
+
+    print(f"{'Satellite':>10} {'Fixed':>6} {'Error m':>10} {'Adaptive':>9} {'Error m':>10}")
+    for sat_id, (fixed_count, fixed_error, count, error) in zip(catalog.sat_ids, rows):
+        print(f"{sat_id:>10} {fixed_count:>6} {fixed_error:>10.1f} {count:>9} {error:>10.1f}")
+    fixed_total = sum(row[0] for row in rows)
+    total = sum(row[2] for row in rows)
+    print(f"\n{total} samples instead of {fixed_total} ({100.0 * (1 - total / fixed_total):.0f}% fewer), "
+          f"max error {max(row[3] for row in rows):.1f} m for a {args.tolerance_m:g} m tolerance")
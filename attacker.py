@@ -1,9 +1,9 @@
 from skyfield.api import EarthSatellite, load
-import simplekml
+from visibility import propagate_itrs, itrs_to_geodetic
+from kml_writer import KmlWriter
 
 # Load TLEs
 ts = load.timescale()
-kml = simplekml.Kml()
 
 # Victim satellite (ISS)
 line1_v = "1 25544U 98067A   24127.54791667  .00001764  00000+0  43262-4 0  9996"
@@ -15,21 +15,14 @@ line1_a = "1 99999U 24001A   24127.54791667  .00001764  00000+0  50000-4 0  9990
 line2_a = "2 99999  56.6448  81.1126 0004062 132.3403  38.2068 15.50620765393018"
 attacker = EarthSatellite(line1_a, line2_a, "Attacker Satellite")
 
-# Generate coordinates for each
+# Ground tracks for both satellites in one batch
 times = ts.utc(2024, 5, 7, range(0, 90, 5))
-victim_coords = []
-attacker_coords = []
+lon, lat, _ = itrs_to_geodetic(propagate_itrs([victim, attacker], times))
+timestamps = times.utc_strftime("%Y-%m-%dT%H:%M:%SZ")
 
-for t in times:
-    sp_v = victim.at(t).subpoint()
-    sp_a = attacker.at(t).subpoint()
-    victim_coords.append((sp_v.longitude.degrees, sp_v.latitude.degrees))
-    attacker_coords.append((sp_a.longitude.degrees, sp_a.latitude.degrees))
-    kml.newpoint(name=f"Victim-{t.utc_iso()}", coords=[(sp_v.longitude.degrees, sp_v.latitude.degrees)])
-    kml.newpoint(name=f"Attacker-{t.utc_iso()}", coords=[(sp_a.longitude.degrees, sp_a.latitude.degrees)])
-
-# Draw orbits
-kml.newlinestring(name="Victim Orbit", coords=victim_coords).style.linestyle.color = simplekml.Color.green
-kml.newlinestring(name="Attacker Orbit", coords=attacker_coords).style.linestyle.color = simplekml.Color.red
-
-kml.save("two_satellites.kml")
+# One time-stamped gx:Track per satellite
+with KmlWriter("two_satellites.kml", name="Victim and Attacker") as kml:
+    kml.style("victim", [0, 255, 0, 255])    # Green
+    kml.style("attacker", [255, 0, 0, 255])  # Red
+    kml.track("Victim Orbit", timestamps, lon[0], lat[0], style_id="victim", altitude_mode="clampToGround")
+    kml.track("Attacker Orbit", timestamps, lon[1], lat[1], style_id="attacker", altitude_mode="clampToGround")
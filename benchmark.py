@@ -0,0 +1,157 @@
+from skyfield.api import load, utc
+from datetime import datetime, timedelta
+from parallel_propagation import propagate_tles
+from visibility import itrs_to_geodetic
+from station_registry import load_stations
+from czml_writer import CzmlWriter
+from conjunction import screen_catalog
+from tle_catalog import tle_checksum
+import numpy as np
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import time
+import json
+import os
+
+def synthetic_tles(count, seed=0):
+    """
+    Deterministic catalog of `count` TLE pairs with valid checksums, spread
+    over LEO to GEO mean motions and the 0/60/120 degree ring inclinations
+    used by satellite_tles.txt
+    """
+    rng = np.random.default_rng(seed)
+    tles = []
+    for satnum in range(1, count + 1):
+        inclination = rng.choice([0.0, 60.0, 120.0]) + rng.uniform(0, 2)
+        raan = rng.uniform(0, 360)
+        eccentricity = int(rng.uniform(0, 0.01) * 1e7)
+        arg_perigee = rng.uniform(0, 360)
+        mean_anomaly = rng.uniform(0, 360)
+        mean_motion = rng.uniform(1.0, 15.5)
+        line1 = f"1 {satnum:05d}U 24001A   24128.00000000  .00000000  00000-0  00000-0 0  999"
+        line2 = (f"2 {satnum:05d} {inclination:8.4f} {raan:8.4f} {eccentricity:07d} "
+                 f"{arg_perigee:8.4f} {mean_anomaly:8.4f} {mean_motion:11.8f}    1")
+        tles.append((line1 + str(tle_checksum(line1)), line2 + str(tle_checksum(line2))))
+    return tles
+
+def minute_grid(ts, start, minutes, step_minutes):
+    return ts.from_datetimes([start + timedelta(minutes=i) for i in range(0, minutes, step_minutes)])
+
+def bench_propagation(tles, ts, start):
+    """generate_czml24.py: 90 one-minute samples per satellite, converted to lon/lat/height"""
+    positions = propagate_tles(tles, minute_grid(ts, start, 90, 1))
+    itrs_to_geodetic(positions)
+
+def bench_los(tles, ts, start):
+    """calculate_los.py: 24 hours at 5 minutes against the ground station registry"""
+    positions = propagate_tles(tles, minute_grid(ts, start, 24 * 60, 5))
+    load_stations().contacts(positions)
+
+def bench_czml(tles, ts, start):
+    """generate_los_visualization.py: one 24-hour, 5-minute track packet per satellite"""
+    t = minute_grid(ts, start, 24 * 60, 5)
+    lon, lat, height = itrs_to_geodetic(propagate_tles(tles, t))
+    timestamps = t.utc_strftime('%Y-%m-%dT%H:%M:%SZ')
+    with tempfile.TemporaryDirectory() as directory:
+        with CzmlWriter(os.path.join(directory, "bench.czml")) as czml:
+            czml.write({"id": "document", "version": "1.0"})
+            for s, (line1, _) in enumerate(tles):
+                points = []
+                for i, timestamp in enumerate(timestamps):
+                    points.extend([timestamp, float(lon[s, i]), float(lat[s, i]), float(height[s, i]) * 1000])
+                czml.write({
+                    "id": f"Satellite/{line1[2:7]}",
+                    "position": {
+                        "interpolationAlgorithm": "LAGRANGE",
+                        "interpolationDegree": 5,
+                        "cartographicDegrees": points
+                    }
+                })
+
+def bench_proximity(tles, ts, start):
+    """proximity.py scaled to the whole catalog: 6 hours at 1 minute, 10 km threshold"""
+    screen_catalog(tles, minute_grid(ts, start, 6 * 60 + 1, 1), threshold_km=10.0)
+
+WORKLOADS = {
+    "propagation": bench_propagation,
+    "los": bench_los,
+    "czml": bench_czml,
+    "proximity": bench_proximity
+}
+
+def run_workload(name, tles, ts, start, repeat):
+    """Wall-clock times over `repeat` runs plus the traced peak memory of one extra run"""
+    workload = WORKLOADS[name]
+    times = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        workload(tles, ts, start)
+        times.append(time.perf_counter() - began)
+
+    tracemalloc.start()
+    workload(tles, ts, start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "workload": name,
+        "satellites": len(tles),
+        "times_s": times,
+        "min_s": min(times),
+        "median_s": float(np.median(times)),
+        "peak_memory_bytes": peak
+    }
+
+def compare(results, baseline):
+    """Print median-time and peak-memory ratios against a previous results file"""
+    previous = {(r["workload"], r["satellites"]): r for r in baseline["results"]}
+    print(f"\n{'workload':<12}{'satellites':>11}{'time ratio':>12}{'memory ratio':>14}")
+    for r in results:
+        old = previous.get((r["workload"], r["satellites"]))
+        if old is None:
+            continue
+        print(f"{r['workload']:<12}{r['satellites']:>11}"
+              f"{r['median_s'] / old['median_s']:>12.2f}"
+              f"{r['peak_memory_bytes'] / max(old['peak_memory_bytes'], 1):>14.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmarks for the propagation, LOS, CZML and proximity pipelines")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[24, 1000, 10000])
+    parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    ts = load.timescale()
+    start = datetime(2024, 5, 8, 0, 0, 0, tzinfo=utc)
+    results = []
+
+    for size in args.sizes:
+        tles = synthetic_tles(size)
+        for name in args.workloads:
+            result = run_workload(name, tles, ts, start, args.repeat)
+            results.append(result)
+            print(f"{name:<12}{size:>7} satellites  median {result['median_s']:8.3f} s  "
+                  f"peak {result['peak_memory_bytes'] / 2 ** 20:8.1f} MiB")
+
+    report = {
+        "meta": {
+            "created": datetime.now(tz=utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark results have been saved to '{args.output}'")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(results, json.load(f))
@@ -1,145 +1,146 @@
-from skyfield.api import load, EarthSatellite, wgs84, utc
-from datetime import datetime, timedelta
+from skyfield.api import load, EarthSatellite
+from datetime import timedelta
+from visibility import DAY_S, find_passes
+from visibility_store import write_contacts, VisibilityStore
+from instrumentation import span
+from station_registry import load_stations
+from rolling_visibility import RollingVisibility, DEFAULT_CHUNK_MINUTES
+from ephemeris_cache import cached_positions
+from tle_catalog import load_catalog
+from time_window import add_window_arguments, window_start
 import numpy as np
+import argparse
 import json
 
-# Ground station data
-ground_stations = {
-    "US_West": {
-        "name": "Boardman, Oregon (USA)",
-        "coordinates": [45.8397, -119.7006],
-        "color": [255, 0, 0, 255]
-    },
-    "US_East": {
-        "name": "Wallops Island (USA)",
-        "coordinates": [37.9402, -75.4664],
-        "color": [255, 165, 0, 255]
-    },
-    "Europe": {
-        "name": "Dublin (Ireland)",
-        "coordinates": [53.3331, -6.2489],
-        "color": [255, 255, 0, 255]
-    },
-    "Asia_Pacific": {
-        "name": "Sydney (Australia)",
-        "coordinates": [-33.8688, 151.2093],
-        "color": [148, 0, 211, 255]
-    },
-    "Middle_East": {
-        "name": "Bahrain",
-        "coordinates": [26.0667, 50.5577],
-        "color": [0, 0, 255, 255]
-    },
-    "Africa": {
-        "name": "Cape Town (South Africa)",
-        "coordinates": [-33.9249, 18.4241],
-        "color": [139, 69, 19, 255]
-    }
-}
-
-def calculate_elevation_angle(satellite_position, ground_station_position, time):
-    """
-    Calculate elevation angle between a ground station and satellite
-    Returns angle in degrees above horizon
-    """
-    # Convert ground station to geocentric position at the given time
-    geocentric_station = ground_station_position.at(time)
-    
-    # Calculate topocentric position (relative to ground station)
-    difference = satellite_position - geocentric_station
-    alt, az, distance = difference.altaz()
-    return alt.degrees
-
-def is_visible(satellite_position, ground_station_position, time, min_elevation=10.0):
-    """
-    Determine if satellite is visible from ground station
-    min_elevation: minimum elevation angle in degrees (default 10°)
-    """
-    elevation = calculate_elevation_angle(satellite_position, ground_station_position, time)
-    return elevation > min_elevation
+parser = argparse.ArgumentParser(description="Ground station line of sight visibility")
+parser.add_argument("--passes", action="store_true",
+                    help="emit one AOS/TCA/LOS record per pass instead of fixed-step samples")
+parser.add_argument("--pass-step-minutes", type=float, default=10,
+                    help="coarse grid used to bracket horizon crossings in --passes mode")
+parser.add_argument("--incremental", action="store_true",
+                    help="reuse time-chunked segments from earlier runs, computing only new chunks")
+parser.add_argument("--chunk-minutes", type=float, default=DEFAULT_CHUNK_MINUTES,
+                    help="segment length in --incremental mode")
+parser.add_argument("--json", action="store_true",
+                    help="also export the samples as visibility_data.json")
+add_window_arguments(parser)
+args = parser.parse_args()
+
+# Ground station registry
+stations = load_stations(args.station_file)
+ground_stations = stations.as_dict()
 
 # Load TLEs
 ts = load.timescale()
-tles = {}
+tles = load_catalog(args.tle_file).as_dict()
 
-with open('satellite_tles.txt', 'r') as f:
-    tle_lines = f.readlines()
+# Calculate visibility over time
+start_time = window_start(args)
+duration_hours = args.hours
+time_step_minutes = args.step_minutes
 
-# Process TLE lines in pairs
-for i in range(0, len(tle_lines), 2):
-    tle1 = tle_lines[i].strip()
-    tle2 = tle_lines[i + 1].strip()
-    sat_id = tle1[2:7]
-    tles[sat_id] = [tle1, tle2]
+sat_ids = list(tles.keys())
+satellites = [EarthSatellite(tle1, tle2, f"Satellite_{sat_id}", ts) for sat_id, (tle1, tle2) in tles.items()]
+station_ids = stations.ids
 
-# Create ground station objects
-station_objects = {}
-for station_id, station in ground_stations.items():
-    lat, lon = station['coordinates']
-    station_objects[station_id] = wgs84.latlon(lat, lon)
+def format_offset(seconds):
+    """Timestamp string for an offset in seconds from start_time"""
+    return (start_time + timedelta(seconds=round(float(seconds)))).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-# Calculate visibility over time
-start_time = datetime(2024, 5, 8, 0, 0, 0, tzinfo=utc)
-duration_hours = 24
-time_step_minutes = 5
-visibility_data = {station_id: {} for station_id in ground_stations.keys()}
-
-# Generate time points
-time_points = []
-for i in range(duration_hours * 60 // time_step_minutes):
-    time = start_time + timedelta(minutes=i * time_step_minutes)
-    time_points.append(ts.from_datetime(time))
-
-# Calculate visibility for each satellite and ground station
-print("Calculating Line of Sight visibility...")
-for sat_id, (tle1, tle2) in tles.items():
-    satellite = EarthSatellite(tle1, tle2, f"Satellite_{sat_id}", ts)
-    
-    for t in time_points:
-        satellite_position = satellite.at(t)
-        
-        for station_id, station_position in station_objects.items():
-            if station_id not in visibility_data:
-                visibility_data[station_id] = {}
-            if sat_id not in visibility_data[station_id]:
-                visibility_data[station_id][sat_id] = []
-            
-            visible = is_visible(satellite_position, station_position, t)
-            if visible:
-                timestamp = t.utc_datetime().strftime("%Y-%m-%dT%H:%M:%SZ")
-                elevation = calculate_elevation_angle(satellite_position, station_position, t)
-                visibility_data[station_id][sat_id].append({
-                    'timestamp': timestamp,
-                    'elevation': elevation
-                })
-
-# Generate visibility report
-print("\nVisibility Report:")
-print("=================")
-
-for station_id, station_data in visibility_data.items():
-    print(f"\nGround Station: {ground_stations[station_id]['name']}")
-    
-    total_visible_time = 0
-    max_gap = timedelta(0)
-    
-    for sat_id, visibility_windows in station_data.items():
-        if visibility_windows:  # If there are visibility periods for this satellite
-            print(f"\n  Satellite {sat_id}:")
-            visible_time = len(visibility_windows) * time_step_minutes
-            total_visible_time += visible_time
-            
-            # Print visibility windows
-            for window in visibility_windows:
-                print(f"    Time: {window['timestamp']}, Elevation: {window['elevation']:.1f}°")
-            
-            print(f"    Total visible time: {visible_time} minutes")
-
-    print(f"\n  Total visibility time for all satellites: {total_visible_time} minutes")
-    print(f"  Average visibility per day: {total_visible_time / duration_hours:.1f} minutes/hour")
-
-# Save visibility data to JSON file
-with open('visibility_data.json', 'w') as f:
-    json.dump(visibility_data, f, indent=2)
-
-print("\nVisibility data has been saved to 'visibility_data.json'") 
\ No newline at end of file
+if args.passes:
+    # Coarse grid (including the window end) only brackets the crossings
+    num_steps = int(duration_hours * 60 // args.pass_step_minutes) + 1
+    time_points = ts.from_datetimes([start_time + timedelta(minutes=i * args.pass_step_minutes)
+                                     for i in range(num_steps)])
+
+    print("Finding Line of Sight passes...")
+    passes = find_passes(satellites, stations.topos(), time_points, min_elevation=stations.min_elevation,
+                         positions=cached_positions(tles.values(), time_points))
+    pass_data = {station_id: {sat_id: [] for sat_id in sat_ids} for station_id in station_ids}
+    for p in passes:
+        pass_data[station_ids[p['station']]][sat_ids[p['sat']]].append({
+            'aos': format_offset(p['aos']),
+            'tca': format_offset(p['tca']),
+            'max_elevation': float(p['max_elevation']),
+            'los': format_offset(p['los'])
+        })
+
+    # Generate pass report
+    print("\nPass Report:")
+    print("============")
+
+    for station_id, station_data in pass_data.items():
+        print(f"\nGround Station: {ground_stations[station_id]['name']}")
+        station_passes = passes[passes['station'] == station_ids.index(station_id)]
+        for sat_id, sat_passes in station_data.items():
+            if sat_passes:
+                print(f"\n  Satellite {sat_id}:")
+                for window in sat_passes:
+                    print(f"    AOS: {window['aos']}, TCA: {window['tca']} "
+                          f"({window['max_elevation']:.1f}°), LOS: {window['los']}")
+        total_visible_time = np.sum(station_passes['los'] - station_passes['aos']) / 60
+        print(f"\n  Total visibility time for all satellites: {total_visible_time:.1f} minutes")
+
+    with open('visibility_passes.json', 'w') as f, span("json.dump"):
+        json.dump(pass_data, f, indent=2)
+
+    print("\nPass data has been saved to 'visibility_passes.json'")
+
+elif args.incremental:
+    # Only chunks not already on disk are computed; expired ones are dropped
+    print("Updating rolling Line of Sight visibility...")
+    rolling = RollingVisibility(tles.values(), stations, sat_ids, time_step_minutes,
+                                chunk_minutes=args.chunk_minutes)
+    computed, removed = rolling.update(ts, start_time, duration_hours)
+    print(f"Computed {computed} new {args.chunk_minutes:g}-minute chunks, removed {removed} expired chunks")
+    rolling.merge('visibility_data.npz', start_time, duration_hours)
+
+else:
+    # Generate time points as a single Time array
+    num_steps = int(duration_hours * 60 // time_step_minutes)
+    time_points = ts.from_datetimes([start_time + timedelta(minutes=i * time_step_minutes)
+                                     for i in range(num_steps)])
+
+    # Test each satellite only against the stations inside its footprint
+    print("Calculating Line of Sight visibility...")
+    positions = cached_positions(tles.values(), time_points)
+    contacts = stations.contacts(positions)
+
+    # Columnar store of every visible sample; JSON is only an export format
+    write_contacts('visibility_data.npz', station_ids, sat_ids, start_time,
+                   (time_points.tt - time_points[0].tt) * DAY_S, contacts)
+
+if not args.passes:
+    visibility = VisibilityStore('visibility_data.npz')
+
+    # Generate visibility report
+    print("\nVisibility Report:")
+    print("=================")
+
+    for station_id in station_ids:
+        print(f"\nGround Station: {ground_stations[station_id]['name']}")
+
+        total_visible_time = 0
+
+        for sat_id in sat_ids:
+            rows = visibility.rows(station_id, sat_id)
+            if len(rows):  # If there are visibility periods for this satellite
+                print(f"\n  Satellite {sat_id}:")
+                visible_time = len(rows) * time_step_minutes
+                total_visible_time += visible_time
+
+                # Print visibility windows
+                for timestamp, elevation in zip(visibility.timestamps(rows), rows['elevation']):
+                    print(f"    Time: {timestamp}, Elevation: {elevation:.1f}°")
+
+                print(f"    Total visible time: {visible_time} minutes")
+
+        print(f"\n  Total visibility time for all satellites: {total_visible_time} minutes")
+        print(f"  Average visibility per day: {total_visible_time / duration_hours:.1f} minutes/hour")
+
+    print("\nVisibility data has been saved to 'visibility_data.npz'")
+
+    if args.json:
+        with open('visibility_data.json', 'w') as f, span("json.dump"):
+            json.dump(visibility.to_json_dict(), f, indent=2)
+        print("Visibility data has been exported to 'visibility_data.json'")
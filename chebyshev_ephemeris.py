@@ -0,0 +1,208 @@
+from skyfield.api import EarthSatellite, load
+from sgp4.api import Satrec, SatrecArray
+from datetime import timedelta
+from tle_catalog import load_catalog
+from time_window import add_window_arguments, window_start
+from visibility import DAY_S, teme_to_itrs, time_offsets, propagate_at
+from instrumentation import span, count, traced
+from numpy.polynomial import chebyshev
+import numpy as np
+import argparse
+import time
+
+DEFAULT_SEGMENT_SECONDS = 1200.0
+DEFAULT_DEGREE = 12
+DEFAULT_TOLERANCE_KM = 0.001
+MIN_SEGMENT_SECONDS = 60.0
+# Pairs evaluated per block, bounding the gathered coefficients to a few tens of MB
+QUERY_BLOCK = 65536
+
+def _teme_states(satrecs, epoch, seconds):
+    """SGP4 TEME positions and velocities, shape (satellite, time, 3), for seconds from epoch; NaN on errors"""
+    jd, fraction, _ = epoch
+    errors, r, v = SatrecArray(satrecs).sgp4(np.full(len(seconds), jd), fraction + seconds / DAY_S)
+    count("sgp4 samples", errors.size)
+    r[errors != 0] = np.nan
+    v[errors != 0] = np.nan
+    return r, v
+
+def _chebyshev_basis(x, terms):
+    """T_0..T_{terms-1} at x, shape (terms, len(x))"""
+    basis = np.empty((terms, len(x)))
+    basis[0] = 1.0
+    if terms > 1:
+        basis[1] = x
+    twice_x = 2.0 * x
+    for k in range(2, terms):
+        np.multiply(twice_x, basis[k - 1], out=basis[k])
+        basis[k] -= basis[k - 2]
+    return basis
+
+class ChebyshevEphemeris:
+    """
+    Piecewise Chebyshev fit of SGP4 TEME positions over a time window.
+    Each satellite is propagated once at degree + 1 Chebyshev nodes per
+    segment; any later position or velocity query is a vectorized
+    polynomial evaluation with no SGP4 call. The fit is checked against
+    SGP4 between the nodes at build time, and segments are halved until
+    the worst position error is within tolerance_km.
+    Times are seconds from `epoch` (see visibility.time_offsets), so the
+    ephemeris can stand in for visibility.propagate_at.
+    """
+
+    def __init__(self, satrecs, epoch, duration_seconds, segment_seconds=DEFAULT_SEGMENT_SECONDS,
+                 degree=DEFAULT_DEGREE, tolerance_km=DEFAULT_TOLERANCE_KM):
+        self.epoch = epoch
+        self.satellites = len(satrecs)
+        self.duration = float(duration_seconds)
+        self.degree = degree
+        while True:
+            self._fit(satrecs, segment_seconds)
+            self.max_error_km, self.max_velocity_error_km_s = self._check(satrecs)
+            worst = np.nanmax(self.max_error_km, initial=0.0)
+            if tolerance_km is None or worst <= tolerance_km or segment_seconds / 2 < MIN_SEGMENT_SECONDS:
+                break
+            segment_seconds /= 2
+        self.tolerance_km = tolerance_km
+
+    @classmethod
+    def from_tles(cls, tles, t, **kwargs):
+        """Ephemeris for (line1, line2) TLE pairs spanning the skyfield Time array t"""
+        epoch, offsets = time_offsets(t)
+        satrecs = [Satrec.twoline2rv(line1.strip(), line2.strip()) for line1, line2 in tles]
+        return cls(satrecs, epoch, offsets[-1], **kwargs)
+
+    @traced("chebyshev.fit")
+    def _fit(self, satrecs, segment_seconds):
+        terms = self.degree + 1
+        self.segment_seconds = float(segment_seconds)
+        self.segments = max(1, int(np.ceil(self.duration / self.segment_seconds)))
+        # Chebyshev-Gauss nodes: the discrete cosine sums below are then exact coefficients
+        theta = np.pi * (np.arange(terms) + 0.5) / terms
+        x = np.cos(theta)
+        seconds = (np.arange(self.segments)[:, None] + 0.5 * (x + 1.0)) * self.segment_seconds
+        r, v = _teme_states(satrecs, self.epoch, seconds.ravel())
+        r = r.reshape(len(satrecs), self.segments, terms, 3)
+
+        cosines = np.cos(np.outer(np.arange(terms), theta)) * (2.0 / terms)
+        cosines[0] /= 2.0
+        # (satellite, segment, coefficient, axis); velocity is the fit's time derivative
+        coefficients = np.einsum('kj,snjd->snkd', cosines, r)
+        velocity_coefficients = chebyshev.chebder(coefficients, axis=2) * (2.0 / self.segment_seconds)
+        # Position and velocity side by side, one row per (satellite, segment), so a
+        # query gathers a single contiguous row and one matmul yields both
+        table = np.zeros((len(satrecs), self.segments, terms, 6))
+        table[..., :3] = coefficients
+        table[:, :, :terms - 1, 3:] = velocity_coefficients
+        self._table = table.reshape(-1, terms, 6)
+
+    @traced("chebyshev.check")
+    def _check(self, satrecs):
+        """
+        Worst position (km) and velocity (km/s) error per satellite, at the
+        segment ends and midway between the nodes. SGP4's own velocity
+        differs from the derivative of its position by some cm/s, which
+        bounds the velocity figure from below.
+        """
+        terms = self.degree + 1
+        x = np.cos(np.pi * np.arange(terms + 1) / terms)
+        seconds = ((np.arange(self.segments)[:, None] + 0.5 * (x + 1.0)) * self.segment_seconds).ravel()
+        seconds = seconds[seconds <= self.duration]
+        r, v = _teme_states(satrecs, self.epoch, seconds)
+        n_sat = len(satrecs)
+        sat_index = np.repeat(np.arange(n_sat), len(seconds))
+        r_fit, v_fit = self.state_at(sat_index, np.tile(seconds, n_sat))
+        error = np.linalg.norm(r_fit.reshape(r.shape) - r, axis=-1)
+        velocity_error = np.linalg.norm(v_fit.reshape(v.shape) - v, axis=-1)
+        with np.errstate(all='ignore'):
+            return np.nanmax(error, axis=1, initial=0.0), np.nanmax(velocity_error, axis=1, initial=0.0)
+
+    def _evaluate(self, sat_index, seconds):
+        """Position and velocity columns (pair, 6) for (satellite, time) pairs"""
+        sat_index = np.asarray(sat_index, dtype=np.int64)
+        seconds = np.asarray(seconds, dtype=np.float64)
+        out = np.full((len(seconds), 6), np.nan)
+        rows = np.flatnonzero((seconds >= 0.0) & (seconds <= self.duration))
+        for first in range(0, len(rows), QUERY_BLOCK):
+            block = rows[first:first + QUERY_BLOCK]
+            scaled = seconds[block] / self.segment_seconds
+            segment = np.minimum(scaled.astype(np.int64), self.segments - 1)
+            basis = _chebyshev_basis(2.0 * (scaled - segment) - 1.0, self.degree + 1)
+            coefficients = np.take(self._table, sat_index[block] * self.segments + segment, axis=0)
+            out[block] = np.matmul(basis.T[:, None, :], coefficients)[:, 0]
+        return out
+
+    def state_at(self, sat_index, seconds):
+        """
+        TEME position (km) and velocity (km/s) for arbitrary (satellite,
+        time) pairs, like visibility.propagate_at; NaN outside the window
+        """
+        with span("chebyshev.evaluate", pairs=len(seconds)):
+            state = self._evaluate(sat_index, seconds)
+        return state[:, :3], state[:, 3:]
+
+    def positions(self, seconds, sats=None):
+        """
+        ITRS positions (km) of the satellites (all by default) at every
+        time in `seconds`, shape (satellite, time, 3) as propagate_satrecs
+        returns them
+        """
+        seconds = np.asarray(seconds, dtype=np.float64)
+        sats = np.arange(self.satellites) if sats is None else np.asarray(sats)
+        with span("chebyshev.evaluate", pairs=len(sats) * len(seconds)):
+            r_teme = self._evaluate(np.repeat(sats, len(seconds)), np.tile(seconds, len(sats)))[:, :3]
+        jd, _, ut1_fraction = self.epoch
+        return teme_to_itrs(r_teme.reshape(len(sats), len(seconds), 3), jd, ut1_fraction + seconds / DAY_S)
+
+    def nbytes(self):
+        return self._table.nbytes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Chebyshev ephemeris and compare query cost with SGP4")
+    parser.add_argument("--segment-seconds", type=float, default=DEFAULT_SEGMENT_SECONDS)
+    parser.add_argument("--degree", type=int, default=DEFAULT_DEGREE)
+    parser.add_argument("--tolerance-m", type=float, default=DEFAULT_TOLERANCE_KM * 1000.0)
+    parser.add_argument("--queries", type=int, default=1_000_000, help="random (satellite, time) lookups to time")
+    add_window_arguments(parser)
+    args = parser.parse_args()
+
+    ts = load.timescale()
+    catalog = load_catalog(args.tle_file)
+    start_time = window_start(args)
+    t = ts.from_datetimes([start_time, start_time + timedelta(hours=args.hours)])
+
+    began = time.perf_counter()
+    ephemeris = ChebyshevEphemeris.from_tles(catalog.tles(), t, segment_seconds=args.segment_seconds,
+                                             degree=args.degree, tolerance_km=args.tolerance_m / 1000.0)
+    built = time.perf_counter() - began
+    print(f"{len(catalog)} satellites over {args.hours:g} hours: {ephemeris.segments} segments of "
+          f"{ephemeris.segment_seconds:g} s, degree {ephemeris.degree}, {ephemeris.nbytes() / 1024 ** 2:.1f} MiB, "
+          f"built in {built:.2f} s")
+    print(f"Max error vs SGP4: {np.nanmax(ephemeris.max_error_km) * 1000.0:.3f} m, "
+          f"{np.nanmax(ephemeris.max_velocity_error_km_s) * 1e6:.3f} mm/s")
+
+    rng = np.random.default_rng(0)
+    sat_index = rng.integers(0, len(catalog), args.queries)
+    seconds = rng.uniform(0.0, ephemeris.duration, args.queries)
+    satrecs = [Satrec.twoline2rv(line1, line2) for line1, line2 in catalog.tles()]
+
+    began = time.perf_counter()
+    r_fit, v_fit = ephemeris.state_at(sat_index, seconds)
+    fit_elapsed = time.perf_counter() - began
+    began = time.perf_counter()
+    r, v = propagate_at(satrecs, sat_index, ephemeris.epoch, seconds)
+    sgp4_elapsed = time.perf_counter() - began
+    error = np.linalg.norm(r_fit - r, axis=1)
+    print(f"{args.queries} random lookups: Chebyshev {fit_elapsed:.3f} s, batched SGP4 {sgp4_elapsed:.3f} s "
+          f"({sgp4_elapsed / fit_elapsed:.1f}x), max error {np.nanmax(error) * 1000.0:.3f} m")
+
+    # One skyfield call per lookup, as a per-timestamp position helper would make
+    satellites = [EarthSatellite(line1, line2, ts=ts) for line1, line2 in catalog.tles()]
+    lookups = min(args.queries, 2000)
+    query_times = ts.tt_jd(t[0].tt + seconds[:lookups] / DAY_S)
+    began = time.perf_counter()
+    for s, when in zip(sat_index[:lookups], query_times):
+        satellites[s].at(when)
+    per_call = (time.perf_counter() - began) / lookups
+    print(f"EarthSatellite.at: {per_call * 1e6:.0f} us per lookup, "
+          f"{per_call * args.queries / fit_elapsed:.0f}x the Chebyshev cost")
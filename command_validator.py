@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import hmac
+import secrets
+import sys
+import time
+
+VALID, STALE, REPLAY, BAD_TOKEN, CACHE_FULL, MALFORMED = range(6)
+REASONS = ["Valid", "Stale command", "Replayed command", "Token mismatch", "Replay cache full", "Malformed command"]
+_TIMESTAMP_TYPES = (int, float)
+
+def _message(cmd_str, timestamp, nonce):
+    return f"{timestamp}:{nonce}:{cmd_str}".encode()
+
+def create_command(key, cmd_str, timestamp, nonce=None):
+    """
+    Command signed with an HMAC-SHA256 token over its timestamp, nonce and
+    text. The random nonce keeps identical commands sent in the same second
+    distinct, so only true replays repeat a token.
+    """
+    if nonce is None:
+        nonce = secrets.randbits(63)
+    token = hmac.new(key, _message(cmd_str, timestamp, nonce), hashlib.sha256).hexdigest()
+    return {"command": cmd_str, "timestamp": timestamp, "nonce": nonce, "token": token}
+
+class CommandValidator:
+    """
+    Checks ground-station commands for a valid HMAC token, a timestamp
+    within `window` seconds of the current time and a token not seen before.
+    Accepted tokens are kept in per-`bucket_seconds` sets keyed by command
+    timestamp; a bucket is dropped as soon as every command it could hold is
+    stale, so memory follows the command rate over one window and never
+    exceeds max_entries tokens (commands are rejected while it is full).
+    """
+
+    def __init__(self, key, window=60, bucket_seconds=1, max_entries=2_000_000):
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.max_entries = max_entries
+        self.entries = 0
+        self._buckets = {}
+        self._oldest = None
+        # HMAC (RFC 2104) with the padded key hashed once up front: each token
+        # then costs two state copies instead of the full keyed setup
+        block = key if len(key) <= 64 else hashlib.sha256(key).digest()
+        block = block.ljust(64, b"\0")
+        self._inner = hashlib.sha256(bytes(b ^ 0x36 for b in block))
+        self._outer = hashlib.sha256(bytes(b ^ 0x5C for b in block))
+
+    def _slide(self, current_time):
+        """Drop the buckets whose every timestamp is older than the window"""
+        limit = (current_time - self.window) // self.bucket_seconds
+        if self._oldest is None or self._oldest >= limit:
+            return
+        if limit - self._oldest > len(self._buckets):
+            expired = [b for b in self._buckets if b < limit]
+        else:
+            expired = range(self._oldest, limit)
+        for b in expired:
+            seen = self._buckets.pop(b, None)
+            if seen is not None:
+                self.entries -= len(seen)
+        self._oldest = limit
+
+    def memory_bytes(self):
+        """Bytes held by the seen-token cache, token strings included"""
+        return sys.getsizeof(self._buckets) + sum(
+            sys.getsizeof(seen) + sum(map(sys.getsizeof, seen)) for seen in self._buckets.values()
+        )
+
+    def validate(self, received, current_time):
+        """(accepted, reason) for one command, as replay.py's validate_command returns"""
+        status = self.validate_many([received], current_time)[0]
+        return status == VALID, REASONS[status]
+
+    def validate_many(self, commands, current_time):
+        """
+        Status code (VALID, STALE, REPLAY, BAD_TOKEN, CACHE_FULL or
+        MALFORMED) for each command of a batch, in order; a token repeated
+        within the batch is a replay. Cheap checks run before the HMAC, and
+        only commands whose token verifies are remembered. A command missing
+        a field or with a non-numeric timestamp or non-string token is
+        MALFORMED rather than an error, so one bad entry cannot abort a
+        batch whose earlier tokens are already stored.
+        """
+        self._slide(current_time)
+        earliest, latest = current_time - self.window, current_time + self.window
+        buckets, bucket_seconds = self._buckets, self.bucket_seconds
+        inner, outer, compare = self._inner, self._outer, hmac.compare_digest
+        entries, max_entries = self.entries, self.max_entries
+        results = []
+        append = results.append
+
+        try:
+            for command in commands:
+                try:
+                    timestamp = command["timestamp"]
+                    token = command["token"]
+                    text = f"{timestamp}:{command['nonce']}:{command['command']}"
+                except (KeyError, TypeError, IndexError):
+                    append(MALFORMED)
+                    continue
+                if type(timestamp) not in _TIMESTAMP_TYPES or type(token) is not str:
+                    append(MALFORMED)
+                    continue
+                if not earliest <= timestamp <= latest:
+                    append(STALE)
+                    continue
+                b = timestamp // bucket_seconds
+                seen = buckets.get(b)
+                if seen is not None and token in seen:
+                    append(REPLAY)
+                    continue
+
+                h = inner.copy()
+                h.update(text.encode())
+                digest = outer.copy()
+                digest.update(h.digest())
+                if not compare(token.encode(), digest.hexdigest().encode()):
+                    append(BAD_TOKEN)
+                    continue
+                if entries >= max_entries:
+                    append(CACHE_FULL)
+                    continue
+
+                if seen is None:
+                    seen = buckets[b] = set()
+                    if self._oldest is None or b < self._oldest:
+                        self._oldest = b
+                seen.add(token)
+                entries += 1
+                append(VALID)
+        finally:
+            # Tokens stored before any unexpected error stay counted against max_entries
+            self.entries = entries
+        return results
+
+def command_stream(key, commands, first_timestamp, rate):
+    """`commands` signed commands spread evenly at `rate` per second from first_timestamp"""
+    names = ["SET_POWER_LOW", "SET_POWER_HIGH", "SLEW", "DOWNLINK", "SAFE_MODE"]
+    return [create_command(key, names[i % len(names)], first_timestamp + i // rate, i) for i in range(commands)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and memory of the command replay validator")
+    parser.add_argument("--rate", type=int, default=20000, help="commands per second filling the window")
+    parser.add_argument("--window", type=int, default=60)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--replay-fraction", type=float, default=0.1,
+                        help="share of the measured stream that replays earlier commands")
+    args = parser.parse_args()
+
+    key = secrets.token_bytes(32)
+    now = int(time.time())
+    print(f"Signing {args.rate * args.window} commands to fill a {args.window} s window...")
+    backlog = command_stream(key, args.rate * args.window, now - args.window + 1, args.rate)
+    measured = command_stream(key, args.rate * 5, now + 1, args.rate)
+    replays = int(len(measured) * args.replay_fraction)
+    for i in range(replays):
+        measured[i * len(measured) // replays] = backlog[-1 - i]
+
+    validator = CommandValidator(key, window=args.window, max_entries=2 * args.rate * args.window)
+    for first in range(0, len(backlog), args.batch):
+        validator.validate_many(backlog[first:first + args.batch], now)
+    full_entries, cache_bytes = validator.entries, validator.memory_bytes()
+
+    # Stream five more seconds through the full window, sliding it each second
+    counts = [0] * len(REASONS)
+    began = time.perf_counter()
+    for first in range(0, len(measured), args.batch):
+        batch = measured[first:first + args.batch]
+        for status in validator.validate_many(batch, now + 1 + first // args.rate):
+            counts[status] += 1
+    elapsed = time.perf_counter() - began
+
+    print(f"Window load: {full_entries} tokens, {cache_bytes / 2 ** 20:.1f} MiB "
+          f"({cache_bytes / max(full_entries, 1):.0f} bytes per token)")
+    print(f"Throughput: {len(measured) / elapsed:,.0f} validations/s on one core "
+          f"({len(measured)} commands in {elapsed:.2f} s)")
+    for reason, count in zip(REASONS, counts):
+        if count:
+            print(f"  {reason}: {count}")
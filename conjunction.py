@@ -0,0 +1,250 @@
+from skyfield.api import load, utc
+from sgp4.api import Satrec
+from datetime import datetime, timedelta
+from parallel_propagation import propagate_tles, DEFAULT_WORKERS
+from tle_catalog import load_catalog
+from visibility import time_offsets, propagate_at
+import numpy as np
+import argparse
+import itertools
+
+MU_EARTH = 398600.4418  # km^3/s^2
+
+# Neighbour cells to visit from each cell: itself plus the 13 "positive"
+# offsets, so every unordered pair of adjacent cells is visited exactly once
+HALF_NEIGHBOURS = [offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset >= (0, 0, 0)]
+CELL_BITS = 21
+
+def orbit_shells(satrecs):
+    """
+    Perigee radius, apogee radius (km) and perigee speed (km/s) of each
+    satellite from its mean elements
+    """
+    a = np.array([sat.a * sat.radiusearthkm for sat in satrecs])
+    e = np.array([sat.ecco for sat in satrecs])
+    perigee = a * (1 - e)
+    apogee = a * (1 + e)
+    perigee_speed = np.sqrt(MU_EARTH * (2 / perigee - 1 / a))
+    return perigee, apogee, perigee_speed
+
+def shells_overlap(perigee, apogee, margin_km):
+    """
+    Mask of objects whose perigee/apogee shell (widened by margin_km) overlaps
+    at least one other object's shell. Objects outside it can never conjunct
+    with anything in the catalog and are not propagated at all.
+    """
+    order = np.argsort(perigee)
+    low = perigee[order] - margin_km
+    high = apogee[order]
+    overlaps = np.zeros(len(order), dtype=bool)
+    if len(order) > 1:
+        # Some earlier shell reaches up to this perigee ...
+        overlaps[1:] |= low[1:] <= np.maximum.accumulate(high)[:-1]
+        # ... or some later perigee (the next one is lowest) is below this apogee
+        overlaps[:-1] |= low[1:] <= high[:-1]
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order] = overlaps
+    return mask
+
+def close_pairs(positions, radius_km):
+    """
+    All pairs (i, j), i < j, of rows of positions (n, 3) closer than
+    radius_km, found with a uniform spatial hash grid of radius_km cells so
+    only objects in neighbouring cells are compared.
+    Returns index arrays i, j and their distances.
+    """
+    valid = np.flatnonzero(np.isfinite(positions).all(axis=1))
+    points = positions[valid]
+    cells = np.floor(points / radius_km).astype(np.int64)
+    offset = 1 << (CELL_BITS - 1)
+
+    def cell_key(c):
+        return ((((c[:, 0] + offset) << CELL_BITS) + (c[:, 1] + offset)) << CELL_BITS) + (c[:, 2] + offset)
+
+    order = np.argsort(cell_key(cells), kind="stable")
+    sorted_keys = cell_key(cells)[order]
+
+    pairs_i = []
+    pairs_j = []
+    for neighbour in HALF_NEIGHBOURS:
+        keys = cell_key(cells + np.array(neighbour))
+        lo = np.searchsorted(sorted_keys, keys, side="left")
+        counts = np.searchsorted(sorted_keys, keys, side="right") - lo
+        total = counts.sum()
+        if total == 0:
+            continue
+        i = np.repeat(np.arange(len(points)), counts)
+        starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+        j = order[np.arange(total) + starts]
+        if neighbour == (0, 0, 0):
+            keep = i < j
+            i, j = i[keep], j[keep]
+        pairs_i.append(i)
+        pairs_j.append(j)
+
+    if not pairs_i:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    i = np.concatenate(pairs_i)
+    j = np.concatenate(pairs_j)
+    distance = np.linalg.norm(points[i] - points[j], axis=1)
+    close = distance < radius_km
+    i, j = valid[i[close]], valid[j[close]]
+    return np.minimum(i, j), np.maximum(i, j), distance[close]
+
+def _encounters(sample, i, j, distance):
+    """
+    Collapse per-sample close pairs into encounters: runs of consecutive
+    samples for the same pair, keeping every local minimum of the sampled
+    distance in each run. Near co-orbital pairs can stay inside the search
+    radius through several separate approaches, each one its own dip.
+    """
+    order = np.lexsort((sample, j, i))
+    sample, i, j, distance = sample[order], i[order], j[order], distance[order]
+    new_run = np.ones(len(sample), dtype=bool)
+    new_run[1:] = (i[1:] != i[:-1]) | (j[1:] != j[:-1]) | (sample[1:] != sample[:-1] + 1)
+    # Neighbours across a run boundary count as infinitely far, so run ends can be minima
+    previous = np.where(new_run, np.inf, np.r_[np.inf, distance[:-1]])
+    following = np.where(np.r_[new_run[1:], True], np.inf, np.r_[distance[1:], np.inf])
+    best = (distance <= previous) & (distance < following)
+    return sample[best], i[best], j[best], distance[best]
+
+def refine_closest_approach(satrecs, i, j, epoch, lo, hi, tolerance_seconds=1e-3, ephemeris=None):
+    """
+    Time of closest approach of satellite pairs (i, j), each bracketed by
+    [lo, hi] seconds from `epoch`, found by vectorized bisection on the sign
+    of the range-rate (r_rel . v_rel). Brackets without a sign change (e.g.
+    at the window edges) resolve to whichever end is closer. With a
+    ChebyshevEphemeris of the same satellites and epoch, the bisection
+    evaluates the fit instead of running SGP4.
+    Returns tca (seconds), miss distance (km) and relative speed (km/s).
+    """
+    def state(sat_index, seconds):
+        if ephemeris is not None:
+            return ephemeris.state_at(sat_index, seconds)
+        return propagate_at(satrecs, sat_index, epoch, seconds)
+
+    def relative_state(i, j, seconds):
+        r_a, v_a = state(i, seconds)
+        r_b, v_b = state(j, seconds)
+        return r_a - r_b, v_a - v_b
+
+    def range_rate_sign(i, j, seconds):
+        r, v = relative_state(i, j, seconds)
+        return np.einsum('ij,ij->i', r, v)
+
+    lo = np.array(lo, dtype=np.float64)
+    hi = np.array(hi, dtype=np.float64)
+    opening_at_lo = range_rate_sign(i, j, lo) >= 0
+    bracketed = ~opening_at_lo & (range_rate_sign(i, j, hi) > 0)
+
+    a, b = lo[bracketed], hi[bracketed]
+    i_bracketed, j_bracketed = i[bracketed], j[bracketed]
+    while len(a) and np.max(b - a) > tolerance_seconds:
+        mid = 0.5 * (a + b)
+        closing = range_rate_sign(i_bracketed, j_bracketed, mid) < 0
+        a = np.where(closing, mid, a)
+        b = np.where(closing, b, mid)
+
+    tca = np.where(opening_at_lo, lo, hi)
+    tca[bracketed] = 0.5 * (a + b)
+    r, v = relative_state(i, j, tca)
+    return tca, np.linalg.norm(r, axis=1), np.linalg.norm(v, axis=1)
+
+def screen_catalog(tles, t, threshold_km=10.0, workers=DEFAULT_WORKERS, chunk_steps=120):
+    """
+    All-vs-all conjunction screening of a list of (line1, line2) TLE pairs
+    over an evenly spaced Time array t.
+
+    1. Objects whose perigee/apogee shell overlaps nobody else's are dropped.
+    2. The rest are propagated in time chunks (bounding memory) and, at each
+       step, a spatial hash grid finds pairs within threshold_km plus the
+       distance two objects can close between samples.
+    3. Pairs whose shells do not overlap are discarded, consecutive hits are
+       merged into encounters, one per local minimum of the sampled range,
+       and each closest approach is refined by root-finding on the
+       range-rate around its sample.
+
+    Returns a record array with fields sat_a, sat_b (indices into tles),
+    tca (seconds from t[0]), miss_distance_km and relative_speed_km_s,
+    sorted by tca.
+    """
+    tles = [(line1.strip(), line2.strip()) for line1, line2 in tles]
+    satrecs = [Satrec.twoline2rv(line1, line2) for line1, line2 in tles]
+    perigee, apogee, perigee_speed = orbit_shells(satrecs)
+    epoch, offsets = time_offsets(t)
+    step = np.max(np.diff(offsets)) if len(offsets) > 1 else 0.0
+
+    active = np.flatnonzero(shells_overlap(perigee, apogee, threshold_km))
+    events = np.zeros(0, dtype=[
+        ('sat_a', np.int32), ('sat_b', np.int32), ('tca', np.float64),
+        ('miss_distance_km', np.float64), ('relative_speed_km_s', np.float64)
+    ])
+    if len(active) < 2:
+        return events
+
+    # The true closest approach is within half a step of some sample, and two
+    # objects close at no more than twice the top speed
+    search_radius = threshold_km + np.max(perigee_speed[active]) * step
+    active_tles = [tles[k] for k in active]
+
+    hit_sample, hit_i, hit_j, hit_distance = [], [], [], []
+    for start in range(0, len(offsets), chunk_steps):
+        positions = propagate_tles(active_tles, t[start:start + chunk_steps], workers=workers)
+        for k in range(positions.shape[1]):
+            i, j, distance = close_pairs(positions[:, k], search_radius)
+            i, j = active[i], active[j]
+            shell_gap = np.maximum(perigee[i], perigee[j]) - np.minimum(apogee[i], apogee[j])
+            keep = shell_gap <= threshold_km
+            hit_sample.append(np.full(keep.sum(), start + k))
+            hit_i.append(i[keep])
+            hit_j.append(j[keep])
+            hit_distance.append(distance[keep])
+
+    sample, i, j, distance = _encounters(np.concatenate(hit_sample), np.concatenate(hit_i),
+                                         np.concatenate(hit_j), np.concatenate(hit_distance))
+    last = len(offsets) - 1
+    tca, miss_distance, relative_speed = refine_closest_approach(
+        satrecs, i, j, epoch, offsets[np.clip(sample - 1, 0, last)], offsets[np.clip(sample + 1, 0, last)])
+    close = miss_distance < threshold_km
+
+    events = np.zeros(close.sum(), dtype=events.dtype)
+    events['sat_a'] = i[close]
+    events['sat_b'] = j[close]
+    events['tca'] = tca[close]
+    events['miss_distance_km'] = miss_distance[close]
+    events['relative_speed_km_s'] = relative_speed[close]
+    return events[np.argsort(events['tca'], kind="stable")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="All-vs-all conjunction screening of a TLE catalog")
+    parser.add_argument("--tle-file", default="satellite_tles.txt")
+    parser.add_argument("--threshold-km", type=float, default=10.0)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--step-seconds", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--output", default="conjunctions.csv")
+    args = parser.parse_args()
+
+    ts = load.timescale()
+    catalog = load_catalog(args.tle_file)
+    tles = catalog.tles()
+    sat_ids = catalog.sat_ids
+
+    start_time = datetime(2024, 5, 8, 0, 0, 0, tzinfo=utc)
+    num_steps = int(args.hours * 3600 // args.step_seconds) + 1
+    t = ts.from_datetimes([start_time + timedelta(seconds=i * args.step_seconds) for i in range(num_steps)])
+
+    print(f"Screening {len(tles)} objects for approaches under {args.threshold_km} km...")
+    events = screen_catalog(tles, t, args.threshold_km, workers=args.workers)
+
+    with open(args.output, 'w') as f:
+        f.write("Sat_A,Sat_B,TCA,Miss_Distance_km,Relative_Speed_km_s\n")
+        for event in events:
+            tca = (start_time + timedelta(seconds=float(event['tca']))).strftime("%Y-%m-%dT%H:%M:%SZ")
+            line = (f"{sat_ids[event['sat_a']]},{sat_ids[event['sat_b']]},{tca},"
+                    f"{event['miss_distance_km']:.3f},{event['relative_speed_km_s']:.3f}")
+            print(f"[CONJUNCTION] {line}")
+            f.write(line + "\n")
+
+    print(f"{len(events)} conjunctions saved to '{args.output}'")
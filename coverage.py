@@ -0,0 +1,146 @@
+from skyfield.api import load
+from datetime import timedelta
+from ephemeris_cache import cached_positions
+from tle_catalog import load_catalog
+from time_window import add_window_arguments, window_start, TIMESTAMP_FORMAT
+from visibility import geodetic_to_itrs, elevation_angles, is_visible, footprint_half_angle
+from instrumentation import traced
+import numpy as np
+import argparse
+
+# Covers the geodetic/geocentric latitude difference of the grid and the
+# tilt of the geodetic zenith, each under 0.2 degrees
+FOOTPRINT_MARGIN_DEG = 0.5
+
+def grid_centers(resolution_deg):
+    """Cell-center latitudes (south to north) and longitudes (west to east) in degrees"""
+    lat = -90.0 + resolution_deg * (np.arange(int(round(180.0 / resolution_deg))) + 0.5)
+    lon = -180.0 + resolution_deg * (np.arange(int(round(360.0 / resolution_deg))) + 0.5)
+    return lat, lon
+
+def footprint_cells(lat, lon, sub_lat, sub_lon, half_angle):
+    """
+    Flat (row * n_lon + column) indices of grid cells whose centers lie
+    within half_angle of the subsatellite point, as contiguous longitude
+    runs per latitude row
+    """
+    n_lon = len(lon)
+    resolution = lon[1] - lon[0]
+    lo, hi = np.searchsorted(lat, [sub_lat - half_angle, sub_lat + half_angle])
+    rows = np.arange(lo, hi)
+    if not len(rows):
+        return rows
+
+    # Longitude half-width of the spherical cap at each row's latitude
+    phi, phi_s, cap = np.radians(lat[rows]), np.radians(sub_lat), np.radians(half_angle)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_dlon = (np.cos(cap) - np.sin(phi) * np.sin(phi_s)) / (np.cos(phi) * np.cos(phi_s))
+    dlon = np.degrees(np.arccos(np.clip(cos_dlon, -1.0, 1.0)))
+    dlon[~(cos_dlon > -1.0)] = 180.0
+    first = np.floor((sub_lon - dlon - lon[0]) / resolution).astype(int) + 1
+    count = np.minimum(np.floor((sub_lon + dlon - lon[0]) / resolution).astype(int) - first + 1, n_lon)
+    keep = count > 0
+    rows, first, count = rows[keep], first[keep], count[keep]
+
+    # Expand the runs without a Python loop over rows
+    run_start = np.repeat(np.cumsum(count) - count, count)
+    columns = (np.repeat(first, count) + np.arange(count.sum()) - run_start) % n_lon
+    return np.repeat(rows, count) * n_lon + columns
+
+@traced("coverage.compute")
+def compute_coverage(positions, lat, lon, step_minutes, min_elevation=10.0):
+    """
+    Coverage statistics for every cell of the lat/lon grid against ITRS
+    satellite positions of shape (satellite, time, 3) sampled every
+    step_minutes. Each time step only tests the cells inside some satellite's
+    footprint, with the same elevation mask as is_visible.
+    Returns (coverage percent, max gap minutes, mean revisit minutes), each
+    a float32 raster of shape (len(lat), len(lon)). Max gap counts the
+    uncovered stretches at either end of the window; mean revisit is the
+    mean gap between coverage periods and NaN for cells with none.
+    """
+    n_cells = len(lat) * len(lon)
+    n_times = positions.shape[1]
+
+    radius = np.linalg.norm(positions, axis=-1)
+    sub_lat = np.degrees(np.arcsin(positions[..., 2] / radius))
+    sub_lon = np.degrees(np.arctan2(positions[..., 1], positions[..., 0]))
+    half_angle = footprint_half_angle(positions, min_elevation) + FOOTPRINT_MARGIN_DEG
+
+    covered_steps = np.zeros(n_cells, dtype=np.int32)
+    last_covered = np.full(n_cells, -1, dtype=np.int32)
+    max_gap = np.zeros(n_cells, dtype=np.int32)
+    gap_total = np.zeros(n_cells, dtype=np.int64)
+    gap_count = np.zeros(n_cells, dtype=np.int32)
+
+    for k in range(n_times):
+        covered = np.zeros(n_cells, dtype=bool)
+        for s in range(len(positions)):
+            if not np.isfinite(half_angle[s, k]):
+                continue
+            cells = footprint_cells(lat, lon, sub_lat[s, k], sub_lon[s, k], half_angle[s, k])
+            cells = cells[~covered[cells]]
+            if not len(cells):
+                continue
+            # Cell geometry is built for candidates only, so memory follows the footprint, not the grid
+            cell_positions, cell_zenith = geodetic_to_itrs(lat[cells // len(lon)], lon[cells % len(lon)])
+            elevations = elevation_angles(positions[s:s + 1, k:k + 1], cell_positions, cell_zenith)
+            covered[cells[is_visible(elevations[0, :, 0], min_elevation)]] = True
+
+        cells = np.flatnonzero(covered)
+        gap = k - last_covered[cells] - 1
+        max_gap[cells] = np.maximum(max_gap[cells], gap)
+        revisit = (gap > 0) & (last_covered[cells] >= 0)
+        gap_total[cells[revisit]] += gap[revisit]
+        gap_count[cells[revisit]] += 1
+        last_covered[cells] = k
+        covered_steps[cells] += 1
+
+    max_gap = np.maximum(max_gap, n_times - last_covered - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_revisit = np.where(gap_count > 0, gap_total / gap_count, np.nan)
+
+    shape = (len(lat), len(lon))
+    return (
+        (100.0 * covered_steps / n_times).astype(np.float32).reshape(shape),
+        (max_gap * step_minutes).astype(np.float32).reshape(shape),
+        (mean_revisit * step_minutes).astype(np.float32).reshape(shape)
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Global coverage and revisit-time grid")
+    parser.add_argument("--resolution", type=float, default=1.0, help="grid cell size in degrees")
+    parser.add_argument("--min-elevation", type=float, default=10.0)
+    parser.add_argument("--output", default="coverage.npz")
+    add_window_arguments(parser)
+    args = parser.parse_args()
+
+    ts = load.timescale()
+    tles = load_catalog(args.tle_file).tles()
+    start_time = window_start(args)
+    num_steps = int(args.hours * 60 // args.step_minutes)
+    time_points = ts.from_datetimes([start_time + timedelta(minutes=i * args.step_minutes)
+                                     for i in range(num_steps)])
+
+    lat, lon = grid_centers(args.resolution)
+    print(f"Computing coverage of {len(lat) * len(lon)} cells over {num_steps} time steps...")
+    coverage, max_gap, mean_revisit = compute_coverage(cached_positions(tles, time_points), lat, lon,
+                                                       args.step_minutes, args.min_elevation)
+
+    np.savez_compressed(
+        args.output,
+        coverage_percent=coverage,
+        max_gap_minutes=max_gap,
+        mean_revisit_minutes=mean_revisit,
+        lat=lat,
+        lon=lon,
+        start=np.array([start_time.strftime(TIMESTAMP_FORMAT)]),
+        step_minutes=np.array([args.step_minutes]),
+        min_elevation=np.array([args.min_elevation])
+    )
+
+    weights = np.cos(np.radians(lat))[:, None] * np.ones_like(coverage)
+    print(f"Area-weighted mean coverage: {np.average(coverage, weights=weights):.1f}%")
+    print(f"Cells never covered: {np.count_nonzero(coverage == 0)} of {coverage.size}")
+    print(f"Worst maximum gap: {np.max(max_gap):.0f} minutes")
+    print(f"\nCoverage rasters have been saved to '{args.output}'")
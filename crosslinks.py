@@ -0,0 +1,210 @@
+from skyfield.api import load
+from datetime import timedelta
+from ephemeris_cache import cached_positions
+from tle_catalog import load_catalog
+from station_registry import load_stations
+from time_window import add_window_arguments, window_start, TIMESTAMP_FORMAT
+from instrumentation import traced
+import numpy as np
+import argparse
+import os
+import time
+
+SPEED_OF_LIGHT_KM_S = 299792.458
+EARTH_RADIUS_KM = 6378.137
+# Links grazing lower than this above the surface are treated as blocked
+DEFAULT_ATMOSPHERE_KM = 80.0
+# Neighbours in the satellite_tles.txt rings are about 15,000 km apart
+DEFAULT_MAX_RANGE_KM = 20000.0
+
+def link_visibility(positions, max_range_km=DEFAULT_MAX_RANGE_KM, atmosphere_km=DEFAULT_ATMOSPHERE_KM,
+                    chunk_rows=1024):
+    """
+    Satellite pairs with a clear line of sight at one instant, for ITRS
+    positions of shape (satellite, 3). Pairs beyond max_range_km are
+    pruned from a Gram-matrix distance computed a block of rows at a time,
+    then the survivors get the occlusion test: the closest point of the
+    segment between them must stay above the Earth plus atmosphere_km.
+    Returns (a, b, range_km) with a < b.
+    """
+    n = len(positions)
+    ok = np.isfinite(positions).all(axis=1)
+    p = np.where(ok[:, None], positions, 0.0)
+    norm2 = np.einsum('ij,ij->i', p, p)
+    blocked_radius2 = (EARTH_RADIUS_KM + atmosphere_km) ** 2
+
+    found = []
+    for first in range(0, n, chunk_rows):
+        rows = slice(first, min(first + chunk_rows, n))
+        distance2 = norm2[rows, None] + norm2[None, :] - 2.0 * (p[rows] @ p.T)
+        a, b = np.nonzero(distance2 <= max_range_km ** 2)
+        a += first
+        keep = (b > a) & ok[a] & ok[b]
+        a, b = a[keep], b[keep]
+
+        # Closest approach of the segment a->b to the Earth's center
+        d = p[b] - p[a]
+        d2 = np.einsum('ij,ij->i', d, d)
+        s = np.clip(-np.einsum('ij,ij->i', p[a], d) / d2, 0.0, 1.0)
+        closest = p[a] + s[:, None] * d
+        clear = np.einsum('ij,ij->i', closest, closest) > blocked_radius2
+        found.append((a[clear], b[clear], np.sqrt(d2[clear])))
+    a, b, distance = (np.concatenate(column) for column in zip(*found)) if found else ([], [], [])
+    return np.asarray(a, dtype=np.uint32), np.asarray(b, dtype=np.uint32), np.asarray(distance, dtype=np.float32)
+
+@traced("crosslinks.compute")
+def compute_crosslinks(positions, max_range_km=DEFAULT_MAX_RANGE_KM, atmosphere_km=DEFAULT_ATMOSPHERE_KM):
+    """
+    Time-indexed sparse adjacency for ITRS positions of shape (satellite,
+    time, 3): the links of step k are rows step_start[k] up to
+    step_start[k + 1] of (a, b, range_km), each undirected pair once.
+    """
+    step_start = [0]
+    a, b, distance = [], [], []
+    for k in range(positions.shape[1]):
+        link_a, link_b, link_range = link_visibility(positions[:, k], max_range_km, atmosphere_km)
+        a.append(link_a)
+        b.append(link_b)
+        distance.append(link_range)
+        step_start.append(step_start[-1] + len(link_a))
+    return (np.array(step_start, dtype=np.int64), np.concatenate(a), np.concatenate(b),
+            np.concatenate(distance))
+
+def adjacency(step_start, a, b, range_km, k, n_sat):
+    """
+    Symmetric CSR adjacency (indptr, indices, range_km) of time step k;
+    row i lists the satellites satellite i can link to
+    """
+    rows = slice(step_start[k], step_start[k + 1])
+    src = np.concatenate([a[rows], b[rows]]).astype(np.int64)
+    dst = np.concatenate([b[rows], a[rows]]).astype(np.int64)
+    weight = np.concatenate([range_km[rows], range_km[rows]])
+    order = np.argsort(src, kind='stable')
+    indptr = np.searchsorted(src[order], np.arange(n_sat + 1))
+    return indptr, dst[order], weight[order]
+
+def write_crosslinks(path, sat_ids, start_time, step_seconds, links):
+    """Uncompressed NPZ of the crosslink CSR arrays, written atomically"""
+    step_start, a, b, range_km = links
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            step_start=step_start,
+            a=a,
+            b=b,
+            range_km=range_km,
+            sat_ids=np.array(sat_ids, dtype=str),
+            epoch=np.array([start_time.strftime(TIMESTAMP_FORMAT)]),
+            step_seconds=np.array([step_seconds])
+        )
+    os.replace(tmp_path, path)
+
+def uplink_ranges(positions, stations, contacts):
+    """Slant range in km of each (sat, station, time, elevation) contact"""
+    sat, station, time_index = contacts[:3]
+    return np.linalg.norm(positions[sat, time_index] - stations.positions[station], axis=1)
+
+@traced("crosslinks.latencies")
+def path_latencies(positions, stations, links, queries, max_hops=64):
+    """
+    One-way latency in ms of the shortest ground-station -> constellation
+    -> ground-station route at every time step, for (source, destination)
+    station index pairs. Routes go up to any satellite the source sees
+    above its elevation mask, across crosslinks, and down from any
+    satellite the destination sees; stations never relay. All queries that
+    share a source are solved together by vectorized min-plus relaxation
+    over the step's links. Returns shape (time, query), inf when no route.
+    """
+    step_start, a, b, range_km = links
+    n_sat, n_times = positions.shape[:2]
+    contacts = stations.contacts(positions)
+    sat, station, time_index = contacts[:3]
+    slant = uplink_ranges(positions, stations, contacts)
+    contact_start = np.searchsorted(time_index, np.arange(n_times + 1))
+    sources = sorted({source for source, _ in queries})
+    source_row = {source: i for i, source in enumerate(sources)}
+
+    latency = np.full((n_times, len(queries)), np.inf)
+    for k in range(n_times):
+        rows = slice(step_start[k], step_start[k + 1])
+        # Directed edges sorted by destination, so reduceat takes the best incoming edge per node
+        src = np.concatenate([a[rows], b[rows]]).astype(np.int64)
+        dst = np.concatenate([b[rows], a[rows]]).astype(np.int64)
+        weight = np.concatenate([range_km[rows], range_km[rows]]).astype(np.float64)
+        order = np.argsort(dst, kind='stable')
+        src, dst, weight = src[order], dst[order], weight[order]
+
+        at_k = slice(contact_start[k], contact_start[k + 1])
+        sat_k, station_k, slant_k = sat[at_k], station[at_k], slant[at_k]
+        distance = np.full((len(sources), n_sat), np.inf)
+        for source in sources:
+            up = station_k == source
+            distance[source_row[source], sat_k[up]] = slant_k[up]
+
+        # Only edges leaving a node that improved in the last round can improve another
+        changed = np.isfinite(distance).any(axis=0)
+        for _ in range(max_hops):
+            active = changed[src]
+            if not active.any():
+                break
+            e_src, e_dst, e_weight = src[active], dst[active], weight[active]
+            heads = np.flatnonzero(np.r_[True, e_dst[1:] != e_dst[:-1]])
+            best = np.minimum.reduceat(distance[:, e_src] + e_weight, heads, axis=1)
+            nodes = e_dst[heads]
+            improved = best < distance[:, nodes]
+            distance[:, nodes] = np.minimum(distance[:, nodes], best)
+            changed = np.zeros(n_sat, dtype=bool)
+            changed[nodes[improved.any(axis=0)]] = True
+
+        for q, (source, destination) in enumerate(queries):
+            down = station_k == destination
+            if down.any():
+                latency[k, q] = np.min(distance[source_row[source], sat_k[down]] + slant_k[down])
+    return latency / SPEED_OF_LIGHT_KM_S * 1000.0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inter-satellite link visibility and ground-to-ground routing latency")
+    parser.add_argument("--max-range-km", type=float, default=DEFAULT_MAX_RANGE_KM)
+    parser.add_argument("--atmosphere-km", type=float, default=DEFAULT_ATMOSPHERE_KM,
+                        help="grazing height above the Earth below which a link is blocked")
+    parser.add_argument("--route", nargs=2, action="append", metavar=("SOURCE", "DESTINATION"),
+                        help="station ids to route between (repeatable); defaults to every station pair")
+    parser.add_argument("--output", default="crosslinks.npz")
+    add_window_arguments(parser, step_minutes=1)
+    args = parser.parse_args()
+
+    ts = load.timescale()
+    catalog = load_catalog(args.tle_file)
+    stations = load_stations(args.station_file)
+    start_time = window_start(args)
+    num_steps = int(args.hours * 60 // args.step_minutes)
+    time_points = ts.from_datetimes([start_time + timedelta(minutes=i * args.step_minutes)
+                                     for i in range(num_steps)])
+    positions = cached_positions(catalog.tles(), time_points)
+
+    began = time.perf_counter()
+    links = compute_crosslinks(positions, args.max_range_km, args.atmosphere_km)
+    elapsed = time.perf_counter() - began
+    write_crosslinks(args.output, catalog.sat_ids, start_time, args.step_minutes * 60, links)
+    per_step = np.diff(links[0])
+    print(f"{len(catalog)} satellites, {num_steps} steps: {len(links[1])} links "
+          f"({per_step.mean():.1f} per step, max {per_step.max()}) in {elapsed:.1f} s")
+    print(f"Crosslinks have been saved to '{args.output}'")
+
+    if args.route:
+        queries = [(stations.index_of(source), stations.index_of(destination)) for source, destination in args.route]
+    else:
+        queries = [(i, j) for i in range(len(stations)) for j in range(i + 1, len(stations))]
+    latency = path_latencies(positions, stations, links, queries)
+
+    print(f"\n{'Route':<32} {'Connected':>9} {'Min ms':>8} {'Mean ms':>8} {'Max ms':>8}")
+    for q, (source, destination) in enumerate(queries):
+        connected = np.isfinite(latency[:, q])
+        name = f"{stations.ids[source]} -> {stations.ids[destination]}"
+        if connected.any():
+            values = latency[connected, q]
+            print(f"{name:<32} {100.0 * connected.mean():>8.1f}% {values.min():>8.1f} {values.mean():>8.1f} "
+                  f"{values.max():>8.1f}")
+        else:
+            print(f"{name:<32} {0.0:>8.1f}% {'-':>8} {'-':>8} {'-':>8}")
@@ -0,0 +1,240 @@
+from skyfield.api import load, utc
+from datetime import datetime, timedelta
+from parallel_propagation import propagate_tles
+from tle_catalog import load_catalog
+from time_window import TIMESTAMP_FORMAT, DEFAULT_STATION_FILE
+from czml_writer import encode_packet
+from station_registry import load_stations
+from visibility import itrs_to_geodetic
+from urllib.parse import urlsplit
+import numpy as np
+import argparse
+import asyncio
+import time
+
+OPEN_END = "9999-12-31T23:59:59Z"
+
+class CzmlStream:
+    """
+    One propagation loop shared by every viewer. The catalog is propagated
+    one sample per tick, `lead` ticks ahead of the simulated clock so
+    clients can interpolate; each tick yields only the new position
+    samples plus LoS packets for passes that opened or closed. New viewers
+    get a snapshot of the last `history` samples and the open passes.
+    """
+
+    def __init__(self, catalog, stations, ts, start, tick_seconds=60, lead=5, history=90, speed=1.0):
+        self.ts = ts
+        self.tles = catalog.tles()
+        self.sat_ids = catalog.sat_ids
+        self.start = start
+        self.tick = timedelta(seconds=tick_seconds)
+        self.speed = speed
+        self.lead = lead
+        self.history = history
+        self.stations = stations
+        self.station_ids = stations.ids
+        self.clients = set()
+        self.open_passes = {}  # (sat, station) -> (packet id, AOS timestamp)
+        self.pass_counts = {}
+
+        # Initial history up to the head sample, propagated in one batch
+        times = [start + (i - history + 1 + lead) * self.tick for i in range(history)]
+        self.timestamps, self.lon, self.lat, self.height, contacts = self._sample(times)
+        sat, station, time_index = contacts[:3]
+        for s, g in zip(sat[time_index == history - 1], station[time_index == history - 1]):
+            # AOS is the first sample of the run of contacts ending at the head
+            pair_times = set(time_index[(sat == s) & (station == g)])
+            first = history - 1
+            while first - 1 in pair_times:
+                first -= 1
+            self.open_passes[(s, g)] = (self._pass_id(s, g), self.timestamps[first])
+        self.head = times[-1]
+        self._began = time.monotonic()
+
+    def _sample(self, times):
+        t = self.ts.from_datetimes(times)
+        positions = propagate_tles(self.tles, t)
+        lon, lat, height = itrs_to_geodetic(positions)
+        return [d.strftime(TIMESTAMP_FORMAT) for d in times], lon, lat, height, self.stations.contacts(positions)
+
+    def _pass_id(self, s, g):
+        n = self.pass_counts.get((s, g), 0)
+        self.pass_counts[(s, g)] = n + 1
+        return f"LoS/{self.station_ids[g]}/{self.sat_ids[s]}/{n}"
+
+    def _samples(self, s, columns):
+        points = []
+        for i in columns:
+            points.extend([self.timestamps[i], float(self.lon[s, i]), float(self.lat[s, i]),
+                           float(self.height[s, i]) * 1000])
+        return points
+
+    def _los_packet(self, s, g, packet_id, aos):
+        return {
+            "id": packet_id,
+            "name": f"Line of Sight - {self.station_ids[g]} to Satellite {self.sat_ids[s]}",
+            "availability": f"{aos}/{OPEN_END}",
+            "polyline": {
+                "positions": {
+                    "references": [f"GroundStation/{self.station_ids[g]}#position",
+                                   f"Satellite/{self.sat_ids[s]}#position"]
+                },
+                "material": {"polylineGlow": {"color": {"rgba": [0, 255, 0, 255]}, "glowPower": 0.2}},
+                "width": 2
+            }
+        }
+
+    def snapshot(self):
+        """Packets that bring a new viewer up to the current state"""
+        packets = [{
+            "id": "document",
+            "name": "Live Satellite Stream",
+            "version": "1.0",
+            "clock": {
+                "currentTime": self.clock().strftime(TIMESTAMP_FORMAT),
+                "multiplier": self.speed,
+                "range": "UNBOUNDED",
+                "step": "SYSTEM_CLOCK_MULTIPLIER"
+            }
+        }]
+        for station_id, station in self.stations.as_dict().items():
+            packets.append({
+                "id": f"GroundStation/{station_id}",
+                "name": station["name"],
+                "position": {"cartographicDegrees": [station["coordinates"][1], station["coordinates"][0], 0]},
+                "point": {"pixelSize": 8, "color": {"rgba": station["color"]}},
+                "label": {"text": station["name"], "font": "12pt Roboto", "pixelOffset": {"cartesian2": [0, -20]}}
+            })
+        for s, sat_id in enumerate(self.sat_ids):
+            packets.append({
+                "id": f"Satellite/{sat_id}",
+                "name": f"Satellite {sat_id}",
+                "point": {"pixelSize": 6, "color": {"rgba": [0, 255, 255, 255]}},
+                "path": {"width": 1, "leadTime": 0, "trailTime": 3600, "resolution": 120},
+                "position": {
+                    "interpolationAlgorithm": "LAGRANGE",
+                    "interpolationDegree": 5,
+                    "cartographicDegrees": self._samples(s, range(len(self.timestamps)))
+                }
+            })
+        for (s, g), (packet_id, aos) in self.open_passes.items():
+            packets.append(self._los_packet(s, g, packet_id, aos))
+        return packets
+
+    def clock(self):
+        """Simulated time now"""
+        return self.start + (time.monotonic() - self._began) * self.speed * timedelta(seconds=1)
+
+    def advance(self, head, timestamps, lon, lat, height, contacts):
+        """Append the new head sample; returns the packets describing the change"""
+        self.timestamps = (self.timestamps + timestamps)[-self.history:]
+        self.lon = np.concatenate([self.lon, lon], axis=1)[:, -self.history:]
+        self.lat = np.concatenate([self.lat, lat], axis=1)[:, -self.history:]
+        self.height = np.concatenate([self.height, height], axis=1)[:, -self.history:]
+        self.head = head
+
+        packets = [
+            {"id": f"Satellite/{sat_id}", "position": {"cartographicDegrees": self._samples(s, [-1])}}
+            for s, sat_id in enumerate(self.sat_ids)
+        ]
+        now_visible = set(zip(contacts[0], contacts[1]))
+        for s, g in sorted(now_visible - set(self.open_passes)):
+            packet_id = self._pass_id(s, g)
+            self.open_passes[(s, g)] = (packet_id, timestamps[0])
+            packets.append(self._los_packet(s, g, packet_id, timestamps[0]))
+        for s, g in sorted(set(self.open_passes) - now_visible):
+            packet_id, aos = self.open_passes.pop((s, g))
+            packets.append({"id": packet_id, "availability": f"{aos}/{timestamps[0]}"})
+        return packets
+
+    def broadcast(self, packets):
+        events = [f"data: {encode_packet(packet)}\n\n".encode() for packet in packets]
+        for queue in list(self.clients):
+            if queue.maxsize - queue.qsize() < len(events):
+                # Viewer too slow to keep up; drop it rather than buffer without bound
+                self.clients.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                continue
+            for event in events:
+                queue.put_nowait(event)
+
+    async def run(self):
+        """Propagate a new head sample each time the simulated clock moves a tick"""
+        while True:
+            # The head stays `lead` ticks ahead of the clock
+            due = self.head + self.tick - self.lead * self.tick
+            await asyncio.sleep(max(0.0, (due - self.clock()).total_seconds() / self.speed))
+            # Propagate off the event loop, but update state on it so snapshots stay consistent
+            head = self.head + self.tick
+            sample = await asyncio.to_thread(self._sample, [head])
+            self.broadcast(self.advance(head, *sample))
+
+async def handle_connection(stream, reader, writer, max_queue):
+    """GET /czml streams Server-Sent Events, one CZML packet per event"""
+    request_line = (await reader.readline()).decode("latin-1").split()
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    if len(request_line) < 2 or request_line[0] != "GET" or urlsplit(request_line[1]).path != "/czml":
+        writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        writer.close()
+        return
+
+    queue = asyncio.Queue(maxsize=max_queue)
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                 b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n")
+    # Snapshot and registration happen between ticks, so no update is missed or repeated
+    for packet in stream.snapshot():
+        writer.write(f"data: {encode_packet(packet)}\n\n".encode())
+    stream.clients.add(queue)
+    try:
+        await writer.drain()
+        while (event := await queue.get()) is not None:
+            writer.write(event)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        stream.clients.discard(queue)
+        writer.close()
+
+async def serve(stream, host, port, max_queue):
+    def handler(reader, writer):
+        return handle_connection(stream, reader, writer, max_queue)
+
+    server = await asyncio.start_server(handler, host, port)
+    print(f"Streaming CZML on http://{host}:{port}/czml")
+    async with server:
+        await asyncio.gather(server.serve_forever(), stream.run())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Live CZML over Server-Sent Events for Cesium viewers",
+        epilog="In Cesium: new EventSource(url).onmessage = e => dataSource.process(JSON.parse(e.data))"
+    )
+    parser.add_argument("--tle-file", default="satellite_tles.txt")
+    parser.add_argument("--station-file", default=DEFAULT_STATION_FILE)
+    parser.add_argument("--start", default="now", help="simulated start time, YYYY-MM-DDTHH:MM:SSZ or 'now'")
+    parser.add_argument("--tick-seconds", type=float, default=60, help="simulated time between samples")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulated seconds per wall-clock second")
+    parser.add_argument("--history", type=int, default=90, help="samples sent to viewers that join late")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--max-queue", type=int, default=10000,
+                        help="events buffered per viewer before it is disconnected")
+    args = parser.parse_args()
+
+    if args.start == "now":
+        start = datetime.now(tz=utc).replace(microsecond=0)
+    else:
+        start = datetime.strptime(args.start, TIMESTAMP_FORMAT).replace(tzinfo=utc)
+
+    stream = CzmlStream(load_catalog(args.tle_file), load_stations(args.station_file), load.timescale(), start,
+                        tick_seconds=args.tick_seconds, history=args.history, speed=args.speed)
+    try:
+        asyncio.run(serve(stream, args.host, args.port, args.max_queue))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,76 @@
+from instrumentation import span, count
+import gzip
+import json
+import os
+
+DEFAULT_PRECISION = int(os.environ.get("SAT_CZML_PRECISION", 6))
+DEFAULT_GZIP = os.environ.get("SAT_CZML_GZIP", "") not in ("", "0")
+
+def round_floats(value, precision):
+    """Round every float in a nested packet to `precision` decimal places"""
+    if isinstance(value, float):
+        return round(value, precision)
+    if isinstance(value, dict):
+        return {k: round_floats(v, precision) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [round_floats(v, precision) for v in value]
+    return value
+
+def encode_packet(packet, precision=DEFAULT_PRECISION):
+    """Compact JSON for one packet with floats rounded to `precision` decimals"""
+    if precision is not None:
+        packet = round_floats(packet, precision)
+    return json.dumps(packet, separators=(",", ":"))
+
+class CzmlWriter:
+    """
+    Streaming CZML document writer. Packets are serialized and written as
+    soon as they are produced, so memory stays flat however many entities
+    the document has. Output is compact JSON (one packet per line) with
+    floats rounded to `precision` decimals; precision=None keeps full repr.
+    With gzip=True the output is gzip-compressed and ".gz" is appended to
+    the path if missing. bytes_written counts the UTF-8 document before
+    compression.
+    """
+
+    def __init__(self, path, precision=DEFAULT_PRECISION, gzip=DEFAULT_GZIP):
+        if gzip and not path.endswith(".gz"):
+            path += ".gz"
+        self.path = path
+        self.precision = precision
+        self.packets_written = 0
+        self.bytes_written = 0
+        self._file = _open_output(path, gzip)
+        self._emit("[")
+
+    def _emit(self, text):
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def write(self, packet):
+        """Serialize one packet and append it to the document"""
+        separator = "\n" if self.packets_written == 0 else ",\n"
+        with span("czml.encode"):
+            self._emit(separator + encode_packet(packet, self.precision))
+        self.packets_written += 1
+
+    def close(self):
+        if self._file is not None:
+            self._emit("\n]\n")
+            self._file.close()
+            self._file = None
+            count("czml packets", self.packets_written)
+            count("czml uncompressed bytes", self.bytes_written)
+            count("czml bytes written", os.path.getsize(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _open_output(path, compress):
+    if compress:
+        return gzip.open(path, "wb")
+    return open(path, "wb")
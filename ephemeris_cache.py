@@ -0,0 +1,96 @@
+from parallel_propagation import propagate_tles, DEFAULT_WORKERS
+from visibility import DAY_S
+from instrumentation import traced, count
+import numpy as np
+import hashlib
+import os
+
+DEFAULT_CACHE_DIR = os.environ.get("SAT_EPHEMERIS_CACHE", ".ephemeris_cache")
+DEFAULT_MAX_BYTES = int(os.environ.get("SAT_EPHEMERIS_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+def ephemeris_key(tles, t):
+    """
+    Cache key for a list of (line1, line2) TLE pairs propagated over Time array t
+    """
+    digest = hashlib.sha256()
+    for line1, line2 in tles:
+        digest.update(line1.strip().encode())
+        digest.update(b"\n")
+        digest.update(line2.strip().encode())
+        digest.update(b"\n")
+    # Round to milliseconds so equal grids built different ways share a key
+    digest.update(np.round(np.atleast_1d(t.tt) * DAY_S, 3).tobytes())
+    return digest.hexdigest()
+
+class EphemerisCache:
+    """
+    On-disk store of propagated ITRS positions (km, shape (satellite, time, 3)).
+    Entries are plain .npy files opened memory-mapped, so a cached track is
+    read zero-copy. The least recently used entries are evicted once the
+    cache grows past max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def open(self, key):
+        """Memory-map a cached entry, or return None if it is not cached"""
+        path = self.path(key)
+        try:
+            positions = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used
+        return positions
+
+    def store(self, key, positions):
+        """Write an entry atomically and return it memory-mapped"""
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(positions))
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return np.load(path, mmap_mode="r")
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
+
+    @traced("ephemeris_cache.positions")
+    def positions(self, tles, t, workers=DEFAULT_WORKERS):
+        """
+        ITRS positions for the TLE pairs over Time array t, propagated with
+        SGP4 (across `workers` processes) only if this catalog and grid are
+        not already cached
+        """
+        tles = list(tles)
+        key = ephemeris_key(tles, t)
+        positions = self.open(key)
+        if positions is None:
+            count("ephemeris cache misses")
+            positions = self.store(key, propagate_tles(tles, t, workers=workers))
+        else:
+            count("ephemeris cache hits")
+        return positions
+
+def cached_positions(tles, t, workers=DEFAULT_WORKERS):
+    """ITRS positions from the default shared cache"""
+    return EphemerisCache().positions(tles, t, workers=workers)
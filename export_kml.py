@@ -0,0 +1,51 @@
+from skyfield.api import load
+from datetime import timedelta
+from ephemeris_cache import cached_positions
+from tle_catalog import load_catalog
+from time_window import add_window_arguments, window_start
+from visibility import itrs_to_geodetic
+from kml_writer import KmlWriter, write_tiled_kmz
+import argparse
+
+# Same inclination coloring as generate_los_visualization.py
+RING_STYLES = {
+    "ring-60": [0, 255, 0, 255],     # Green
+    "ring-other": [0, 255, 255, 255]  # Cyan
+}
+
+parser = argparse.ArgumentParser(description="KML/KMZ export of the TLE catalog as gx:Tracks")
+parser.add_argument("--output", default="satellites.kmz", help=".kmz or .kml")
+parser.add_argument("--tiles", action="store_true",
+                    help="split into Region/NetworkLink tiles by time and area (KMZ only)")
+parser.add_argument("--tile-hours", type=float, default=6)
+parser.add_argument("--tile-degrees", type=float, default=90)
+add_window_arguments(parser, hours=24, step_minutes=1)
+args = parser.parse_args()
+
+# Whole catalog, propagated in one batch (shared with the other scripts through the ephemeris cache)
+ts = load.timescale()
+catalog = load_catalog(args.tle_file)
+sat_ids = catalog.sat_ids
+style_of = ["ring-60" if inclination == 60 else "ring-other" for inclination in catalog.records['inclination']]
+
+start_time = window_start(args)
+num_steps = int(args.hours * 60 // args.step_minutes)
+track_times = [start_time + timedelta(minutes=i * args.step_minutes) for i in range(num_steps)]
+timestamps = [t.strftime('%Y-%m-%dT%H:%M:%SZ') for t in track_times]
+lon, lat, height = itrs_to_geodetic(cached_positions(catalog.tles(), ts.from_datetimes(track_times)))
+altitude_m = height * 1000
+
+if args.tiles:
+    if not args.output.endswith(".kmz"):
+        parser.error("--tiles needs a .kmz output")
+    tiles = write_tiled_kmz(args.output, "Satellite Catalog", sat_ids, timestamps, lon, lat, altitude_m,
+                            RING_STYLES, style_of, args.step_minutes,
+                            tile_hours=args.tile_hours, tile_degrees=args.tile_degrees)
+    print(f"{len(sat_ids)} satellites in {tiles} tiles have been saved to '{args.output}'")
+else:
+    with KmlWriter(args.output, name="Satellite Catalog") as kml:
+        for style_id, rgba in RING_STYLES.items():
+            kml.style(style_id, rgba)
+        for s, sat_id in enumerate(sat_ids):
+            kml.track(f"Satellite {sat_id}", timestamps, lon[s], lat[s], altitude_m[s], style_id=style_of[s])
+    print(f"{kml.placemarks_written} satellite tracks have been saved to '{args.output}'")
@@ -1,31 +1,32 @@
-from skyfield.api import EarthSatellite, load
-import json
+from skyfield.api import load
+from adaptive_sampling import sample_tracks
+from czml_writer import CzmlWriter
 from datetime import datetime, timedelta
 
 line1 = "1 10000U 25029BR  25128.63828704  .00001103  00000-0  33518-4 0  9998"
 line2 = "2 10000  45.0000   0.7036 0003481   0.0000   0.3331 4.14466644  1776"
 ts = load.timescale()
-sat = EarthSatellite(line1, line2, "VirtualSat10000", ts)
 
-czml = [{
+czml = CzmlWriter("virtual_satellite_10000.czml")
+czml.write({
     "id": "document",
     "name": "Virtual Satellite 10000",
     "version": "1.0"
-}]
+})
 
 start_time = datetime(2024, 5, 8, 0, 0, 0)
 points = []
 intervals = []
 
-for i in range(0, 90, 1):  # every minute for 90 mins
-    t = ts.utc(2024, 5, 8, 0, i)
-    geo = sat.at(t).subpoint()
-    alt_km = sat.at(t).subpoint().elevation.km  
-    timestamp = (start_time + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
-    points += [timestamp, geo.longitude.degrees, geo.latitude.degrees, alt_km * 1000]
+# Every minute for 90 mins, or adaptive samples when SAT_CZML_TOLERANCE_M is set
+times = [start_time + timedelta(minutes=i) for i in range(0, 90, 1)]
+(timestamps, lon, lat, alt_km), = sample_tracks([(line1, line2)], ts, times)
+
+for i, timestamp in enumerate(timestamps):
+    points += [timestamp, float(lon[i]), float(lat[i]), float(alt_km[i]) * 1000]
     intervals.append(timestamp)
 
-czml.append({
+czml.write({
     "id": "Satellite/10000",
     "availability": f"{intervals[0]}/{intervals[-1]}",
     "label": {
@@ -54,5 +55,4 @@ czml.append({
     }
 })
 
-with open("virtual_satellite_10000.czml", "w") as f:
-    json.dump(czml, f, indent=2)
+czml.close()
@@ -1,5 +1,8 @@
-from skyfield.api import load, EarthSatellite
-import json
+from skyfield.api import load
+from adaptive_sampling import sample_tracks
+from czml_writer import CzmlWriter
+from tle_catalog import load_catalog
+from station_registry import load_stations
 from datetime import datetime, timedelta
 
 # Define colors for different orbital rings
@@ -8,74 +11,29 @@ ring_colors = {
     1: [0, 255, 255, 255]    # Cyan (120 degrees)
 }
 
-# Define ground stations
-ground_stations = {
-    "US_West": {
-        "name": "Boardman, Oregon (USA)",
-        "coordinates": [45.8397, -119.7006],
-        "color": [255, 0, 0, 255]  # Red
-    },
-    "US_East": {
-        "name": "Wallops Island (USA)",
-        "coordinates": [37.9402, -75.4664],
-        "color": [255, 165, 0, 255]  # Orange
-    },
-    "Europe": {
-        "name": "Dublin (Ireland)",
-        "coordinates": [53.3331, -6.2489],
-        "color": [255, 255, 0, 255]  # Yellow
-    },
-    "Asia_Pacific": {
-        "name": "Sydney (Australia)",
-        "coordinates": [-33.8688, 151.2093],
-        "color": [148, 0, 211, 255]  # Purple
-    },
-    "Middle_East": {
-        "name": "Bahrain",
-        "coordinates": [26.0667, 50.5577],
-        "color": [0, 0, 255, 255]  # Blue
-    },
-    "Africa": {
-        "name": "Cape Town (South Africa)",
-        "coordinates": [-33.9249, 18.4241],
-        "color": [139, 69, 19, 255]  # Brown
-    }
-}
+# Ground station registry
+ground_stations = load_stations().as_dict()
 
-# Read TLEs from file
-tles = {}
-colors = {}
+# Read TLEs from file, keeping only the 60 and 120 degree rings
+# (satellites with 0 degree inclination are skipped)
+catalog = load_catalog('satellite_tles.txt')
+ring_of_row = {}
+for ring, inclination in ((0, 60.0), (1, 120.0)):
+    for row in catalog.select(inclination=(inclination, inclination)):
+        ring_of_row[row] = ring
 
-with open('satellite_tles.txt', 'r') as f:
-    tle_lines = f.readlines()
-    
-# Process TLE lines in pairs
-for i in range(0, len(tle_lines), 2):
-    tle1 = tle_lines[i].strip()
-    tle2 = tle_lines[i + 1].strip()
-    
-    # Extract satellite ID from TLE
-    sat_id = tle1[2:7]
-    
-    # Determine ring based on inclination from TLE2
-    inclination = float(tle2[8:16])
-    if inclination == 60:
-        ring = 0  # Green ring
-    elif inclination == 120:
-        ring = 1  # Cyan ring
-    else:
-        continue  # Skip satellites with 0 degree inclination
-        
-    tles[sat_id] = [tle1, tle2]
-    colors[sat_id] = ring_colors[ring]
+rows = sorted(ring_of_row)
+tles = catalog.subset(rows).as_dict()
+colors = {sat_id: ring_colors[ring_of_row[row]] for sat_id, row in zip(tles, rows)}
 
 ts = load.timescale()
 start_time = datetime(2024, 5, 8, 0, 0, 0)
-czml = [{"id": "document", "name": "3D Satellites with Models", "version": "1.0"}]
+czml = CzmlWriter("czml_3d_satellites_with_models.json")
+czml.write({"id": "document", "name": "3D Satellites with Models", "version": "1.0"})
 
 # Add ground stations to CZML
 for station_id, station in ground_stations.items():
-    czml.append({
+    czml.write({
         "id": f"GroundStation/{station_id}",
         "name": station["name"],
         "position": {
@@ -113,17 +71,17 @@ for station_id, station in ground_stations.items():
 
 model_url = "https://raw.githubusercontent.com/AnalyticalGraphicsInc/cesium-models/master/CesiumGround/Apps/SampleData/models/Satellite/Satellite.glb"
 
-for sat_id, (l1, l2) in tles.items():
-    sat = EarthSatellite(l1, l2, f"Satellite_{sat_id}", ts)
+# Every minute for 90 mins, or adaptive samples when SAT_CZML_TOLERANCE_M is set
+times = [start_time + timedelta(minutes=i) for i in range(90)]
+tracks = sample_tracks(tles.values(), ts, times)
+
+for sat_id, (timestamps, lon, lat, alt_km) in zip(tles, tracks):
     points = []
-    for i in range(90):
-        t = ts.utc(2024, 5, 8, 0, i)
-        geo = sat.at(t).subpoint()
-        timestamp = (start_time + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
-        points += [timestamp, geo.longitude.degrees, geo.latitude.degrees, geo.elevation.km * 1000]
+    for i, timestamp in enumerate(timestamps):
+        points += [timestamp, float(lon[i]), float(lat[i]), float(alt_km[i]) * 1000]
 
     color = colors[sat_id]
-    czml.append({
+    czml.write({
         "id": f"Satellite/{sat_id}",
         "availability": f"{points[0]}/{points[-4]}",
         "label": {
@@ -162,5 +120,4 @@ for sat_id, (l1, l2) in tles.items():
         }
     })
 
-with open("czml_3d_satellites_with_models.json", "w") as f:
-    json.dump(czml, f, indent=2)
+czml.close()
@@ -1,69 +1,45 @@
-from skyfield.api import load, EarthSatellite, wgs84, utc
-import json
-from datetime import datetime, timedelta
+from skyfield.api import load, EarthSatellite
+from ephemeris_cache import cached_positions
+from czml_writer import CzmlWriter
+from tle_catalog import load_catalog
+from station_registry import load_stations
+from time_window import add_window_arguments, window_start
+from visibility import itrs_to_geodetic, find_passes
+from adaptive_sampling import sample_tracks
+from instrumentation import span
+from visibility_store import VisibilityStore
+import argparse
+from datetime import timedelta
 import numpy as np
 
-# Ground station data
-ground_stations = {
-    "US_West": {
-        "name": "Boardman, Oregon (USA)",
-        "coordinates": [45.8397, -119.7006],
-        "color": [255, 0, 0, 255]
-    },
-    "US_East": {
-        "name": "Wallops Island (USA)",
-        "coordinates": [37.9402, -75.4664],
-        "color": [255, 165, 0, 255]
-    },
-    "Europe": {
-        "name": "Dublin (Ireland)",
-        "coordinates": [53.3331, -6.2489],
-        "color": [255, 255, 0, 255]
-    },
-    "Asia_Pacific": {
-        "name": "Sydney (Australia)",
-        "coordinates": [-33.8688, 151.2093],
-        "color": [148, 0, 211, 255]
-    },
-    "Middle_East": {
-        "name": "Bahrain",
-        "coordinates": [26.0667, 50.5577],
-        "color": [0, 0, 255, 255]
-    },
-    "Africa": {
-        "name": "Cape Town (South Africa)",
-        "coordinates": [-33.9249, 18.4241],
-        "color": [139, 69, 19, 255]
-    }
-}
+parser = argparse.ArgumentParser(description="Combined satellite and line of sight CZML")
+add_window_arguments(parser)
+args = parser.parse_args()
+
+# Ground station registry
+stations = load_stations(args.station_file)
+ground_stations = stations.as_dict()
 
-def get_satellite_position(sat, timestamp):
-    """Get satellite position at a given timestamp"""
-    t = ts.from_datetime(datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=utc))
-    geo = sat.at(t).subpoint()
-    return [geo.longitude.degrees, geo.latitude.degrees, geo.elevation.km * 1000]
+def split_passes(sample_indices):
+    """Split sorted track indices of visible samples into runs of consecutive steps, one per pass"""
+    passes = []
+    for i in sample_indices:
+        if passes and i == passes[-1][-1] + 1:
+            passes[-1].append(i)
+        else:
+            passes.append([i])
+    return passes
 
-# Load visibility data
-with open('visibility_data.json', 'r') as f:
-    visibility_data = json.load(f)
+# Load visibility data (memory-mapped columns, read per station-satellite pair)
+visibility = VisibilityStore('visibility_data.npz')
 
 # Load TLEs
 ts = load.timescale()
+catalog = load_catalog(args.tle_file)
 tles = {}
-satellites = {}
-
-with open('satellite_tles.txt', 'r') as f:
-    tle_lines = f.readlines()
 
-# Process TLE lines in pairs
-for i in range(0, len(tle_lines), 2):
-    tle1 = tle_lines[i].strip()
-    tle2 = tle_lines[i + 1].strip()
-    sat_id = tle1[2:7]
-    satellites[sat_id] = EarthSatellite(tle1, tle2, f"Satellite_{sat_id}", ts)
-    
+for sat_id, (tle1, tle2), inclination in zip(catalog.sat_ids, catalog.tles(), catalog.records['inclination']):
     # Determine color based on inclination
-    inclination = float(tle2[8:16])
     if inclination == 60:
         color = [0, 255, 0, 255]  # Green
     else:
@@ -71,29 +47,28 @@ for i in range(0, len(tle_lines), 2):
     tles[sat_id] = {"tle1": tle1, "tle2": tle2, "color": color}
 
 # Set up time parameters
-start_time = datetime(2024, 5, 8, 0, 0, 0, tzinfo=utc)
-end_time = start_time + timedelta(days=1)
-interval_minutes = 5
+start_time = window_start(args)
+end_time = start_time + timedelta(hours=args.hours)
+interval_minutes = args.step_minutes
 
 # Create CZML document
-czml = [
-    {
-        "id": "document",
-        "name": "Satellite and LoS Visualization",
-        "version": "1.0",
-        "clock": {
-            "interval": f"{start_time.strftime('%Y-%m-%dT%H:%M:%SZ')}/{end_time.strftime('%Y-%m-%dT%H:%M:%SZ')}",
-            "currentTime": start_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
-            "multiplier": 60,
-            "range": "LOOP_STOP",
-            "step": "SYSTEM_CLOCK_MULTIPLIER"
-        }
+czml = CzmlWriter('combined_visualization.czml')
+czml.write({
+    "id": "document",
+    "name": "Satellite and LoS Visualization",
+    "version": "1.0",
+    "clock": {
+        "interval": f"{start_time.strftime('%Y-%m-%dT%H:%M:%SZ')}/{end_time.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        "currentTime": start_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "multiplier": 60,
+        "range": "LOOP_STOP",
+        "step": "SYSTEM_CLOCK_MULTIPLIER"
     }
-]
+})
 
 # Add ground stations to CZML
 for station_id, station in ground_stations.items():
-    czml.append({
+    czml.write({
         "id": f"GroundStation/{station_id}",
         "name": station["name"],
         "position": {
@@ -127,25 +102,28 @@ for station_id, station in ground_stations.items():
 # Add satellites and their paths
 model_url = "https://raw.githubusercontent.com/AnalyticalGraphicsInc/cesium-models/master/CesiumGround/Apps/SampleData/models/Satellite/Satellite.glb"
 
-for sat_id, sat_data in tles.items():
-    satellite = satellites[sat_id]
+# Generate satellite positions for the entire day, shared with calculate_los.py
+# through the ephemeris cache
+track_times = [start_time + timedelta(minutes=i * interval_minutes)
+               for i in range(int((end_time - start_time) / timedelta(minutes=interval_minutes)))]
+with span("strftime"):
+    track_timestamps = [t.strftime('%Y-%m-%dT%H:%M:%SZ') for t in track_times]
+positions = cached_positions([(d["tle1"], d["tle2"]) for d in tles.values()], ts.from_datetimes(track_times))
+track_lon, track_lat, track_height = itrs_to_geodetic(positions)
+
+# Satellite paths use the same grid, or adaptive samples when SAT_CZML_TOLERANCE_M is set
+tracks = sample_tracks([(d["tle1"], d["tle2"]) for d in tles.values()], ts, track_times)
+
+for (sat_id, sat_data), (timestamps, lon, lat, height) in zip(tles.items(), tracks):
     points = []
-    times = []
-    
-    # Generate satellite positions for the entire day
-    current_time = start_time
-    while current_time < end_time:
-        t = ts.from_datetime(current_time)
-        geo = satellite.at(t).subpoint()
-        points.extend([current_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
-                      geo.longitude.degrees,
-                      geo.latitude.degrees,
-                      geo.elevation.km * 1000])
-        times.append(current_time)
-        current_time += timedelta(minutes=interval_minutes)
+    for i, timestamp in enumerate(timestamps):
+        points.extend([timestamp,
+                      float(lon[i]),
+                      float(lat[i]),
+                      float(height[i]) * 1000])
 
     # Add satellite to CZML
-    czml.append({
+    czml.write({
         "id": f"Satellite/{sat_id}",
         "name": f"Satellite {sat_id}",
         "availability": f"{start_time.strftime('%Y-%m-%dT%H:%M:%SZ')}/{end_time.strftime('%Y-%m-%dT%H:%M:%SZ')}",
@@ -195,53 +173,80 @@ for sat_id, sat_data in tles.items():
         }
     })
 
-# Add Line of Sight visualizations
-for station_id, station_data in visibility_data.items():
+# Add Line of Sight visualizations, looking up satellite positions by index
+# in the track arrays computed above instead of propagating again.
+# visibility_data.npz is a separate artifact, so check it covers this catalog and grid
+if visibility.sat_ids != list(tles) or not set(visibility.station_ids) <= set(ground_stations):
+    parser.error("visibility_data.npz was computed for another catalog or station registry; "
+                 "re-run calculate_los.py with the same --tle-file and --station-file")
+step_seconds = interval_minutes * 60
+index = (visibility.rows()['time'] + (visibility.epoch - start_time).total_seconds()) / step_seconds
+if len(index) and (np.any(index != np.round(index)) or index.min() < 0 or index.max() >= len(track_times)):
+    parser.error(f"visibility_data.npz (epoch {visibility.epoch.strftime('%Y-%m-%dT%H:%M:%SZ')}) does not lie on "
+                 f"this window's {interval_minutes:g}-minute grid from {start_time.strftime('%Y-%m-%dT%H:%M:%SZ')}; "
+                 "re-run calculate_los.py with the same --start, --hours and --step-minutes")
+time_offset = (visibility.epoch - start_time).total_seconds()
+sat_index = {sat_id: i for i, sat_id in enumerate(tles)}
+
+# Refined AOS/LOS of every pass on the same grid, so each LoS entity is
+# available from the horizon crossings rather than only its first and last samples
+satellites = [EarthSatellite(d["tle1"], d["tle2"], sat_id, ts) for sat_id, d in tles.items()]
+passes = find_passes(satellites, stations.topos(), ts.from_datetimes(track_times),
+                     min_elevation=stations.min_elevation, positions=positions)
+
+def format_offset(seconds):
+    return (start_time + timedelta(seconds=round(float(seconds)))).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def pass_availability(s, g, first, last):
+    """AOS/LOS interval of the pass containing track samples first..last, or the samples' own span"""
+    at = first * step_seconds
+    match = passes[(passes['sat'] == s) & (passes['station'] == g) & (passes['aos'] <= at) & (passes['los'] >= at)]
+    if not len(match):
+        return f"{track_timestamps[first]}/{track_timestamps[last]}"
+    return f"{format_offset(match['aos'][0])}/{format_offset(match['los'][0])}"
+
+for station_id in visibility.station_ids:
     station = ground_stations[station_id]
+    g = stations.index_of(station_id)
     station_position = [station["coordinates"][1], station["coordinates"][0], 0]
     
-    for sat_id, visibility_windows in station_data.items():
-        if not visibility_windows:
+    for sat_id in visibility.sat_ids:
+        rows = visibility.rows(station_id, sat_id)
+        if not len(rows):
             continue
         
-        # Create a single polyline entity for all visibility windows of this station-satellite pair
-        los_points = []
-        los_intervals = []
+        s = sat_index[sat_id]
+        samples = [int(round((t + time_offset) / step_seconds)) for t in rows['time']]
         
-        for window in visibility_windows:
-            timestamp = window["timestamp"]
-            sat_position = get_satellite_position(satellites[sat_id], timestamp)
+        # One interval-scoped polyline entity per pass of this station-satellite pair
+        for pass_number, pass_samples in enumerate(split_passes(samples)):
+            los_points = []
+            for i in pass_samples:
+                sat_position = [float(track_lon[s, i]), float(track_lat[s, i]), float(track_height[s, i]) * 1000]
+                los_points.extend(station_position + sat_position)
             
-            # Add the visibility window to intervals
-            los_intervals.append(f"{timestamp}/{timestamp}")
-            
-            # Add the line coordinates
-            los_points.extend(station_position + sat_position)
-        
-        # Create the LoS visualization with intervals
-        czml.append({
-            "id": f"LoS/{station_id}/{sat_id}",
-            "name": f"Line of Sight - {station['name']} to Satellite {sat_id}",
-            "availability": los_intervals[0].split('/')[0] + "/" + los_intervals[-1].split('/')[-1],
-            "polyline": {
-                "positions": {
-                    "cartographicDegrees": los_points
-                },
-                "material": {
-                    "polylineGlow": {
-                        "color": {
-                            "rgba": station["color"]
-                        },
-                        "glowPower": 0.2,
-                        "taperPower": 0.5
-                    }
-                },
-                "width": 2
-            }
-        })
+            czml.write({
+                "id": f"LoS/{station_id}/{sat_id}/{pass_number}",
+                "name": f"Line of Sight - {station['name']} to Satellite {sat_id}",
+                "availability": pass_availability(s, g, pass_samples[0], pass_samples[-1]),
+                "polyline": {
+                    "positions": {
+                        "cartographicDegrees": los_points
+                    },
+                    "material": {
+                        "polylineGlow": {
+                            "color": {
+                                "rgba": station["color"]
+                            },
+                            "glowPower": 0.2,
+                            "taperPower": 0.5
+                        }
+                    },
+                    "width": 2
+                }
+            })
 
 # Save the CZML file
-with open('combined_visualization.czml', 'w') as f:
-    json.dump(czml, f, indent=2)
+czml.close()
 
-print("Combined visualization has been saved to 'combined_visualization.czml'") 
\ No newline at end of file
+print(f"Combined visualization has been saved to '{czml.path}'") 
\ No newline at end of file
@@ -0,0 +1,140 @@
+from functools import wraps
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+# Path of the Chrome-trace JSON to write at exit; unset leaves tracing off
+TRACE_PATH = os.environ.get("SAT_TRACE") or None
+
+_spans = []     # (name, start ns, duration ns, thread id, args)
+_samples = []   # (counter name, time ns, running total)
+_counters = {}
+_child_traces = []
+# Wall clock at the perf_counter origin, so traces from several processes line up
+_origin_ns = time.perf_counter_ns()
+_origin_wall_ns = time.time_ns()
+
+class _Span:
+    __slots__ = ("name", "args", "began")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.began = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        _spans.append((self.name, self.began, time.perf_counter_ns() - self.began, threading.get_ident(), self.args))
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def enabled():
+    return TRACE_PATH is not None
+
+def span(name, **args):
+    """Context manager timing a region; a shared no-op object while tracing is off"""
+    if TRACE_PATH is None:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+def traced(name=None):
+    """
+    Decorator recording a span per call. Decided at import time: with
+    tracing off the function is returned unwrapped, so it costs nothing.
+    """
+    def decorate(func):
+        if TRACE_PATH is None:
+            return func
+        label = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, value=1):
+    """Add to a named counter, e.g. samples emitted or bytes written"""
+    if TRACE_PATH is None:
+        return
+    total = _counters.get(name, 0) + value
+    _counters[name] = total
+    _samples.append((name, time.perf_counter_ns(), total))
+
+def _timestamp_us(ns):
+    return (_origin_wall_ns + ns - _origin_ns) / 1000.0
+
+def trace_events(process_name=None):
+    """Recorded spans and counters as Chrome trace events (microsecond timestamps)"""
+    pid = os.getpid()
+    events = [{"name": "process_name", "ph": "M", "pid": pid,
+               "args": {"name": process_name or os.path.basename(sys.argv[0]) or "python"}}]
+    for name, began, duration, tid, args in _spans:
+        events.append({"name": name, "cat": "sat", "ph": "X", "ts": _timestamp_us(began),
+                       "dur": duration / 1000.0, "pid": pid, "tid": tid, "args": args})
+    for name, at, total in _samples:
+        events.append({"name": name, "cat": "sat", "ph": "C", "ts": _timestamp_us(at), "pid": pid,
+                       "args": {"value": total}})
+    return events
+
+def write_trace(path, events):
+    """Chrome-trace/Perfetto JSON, loadable in chrome://tracing or ui.perfetto.dev"""
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def include_trace(path):
+    """Merge the trace another process writes to path (e.g. a pipeline stage) into this one at exit"""
+    _child_traces.append(path)
+
+def summary():
+    """Per-span call counts and inclusive times, then counter totals, as a text table"""
+    totals = {}
+    for name, _, duration, _, _ in _spans:
+        calls, total, longest = totals.get(name, (0, 0, 0))
+        totals[name] = (calls + 1, total + duration, max(longest, duration))
+    lines = [f"{'Span':<32} {'Calls':>8} {'Total ms':>10} {'Mean ms':>10} {'Max ms':>10}"]
+    for name, (calls, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        lines.append(f"{name:<32} {calls:>8} {total / 1e6:>10.2f} {total / calls / 1e6:>10.3f} {longest / 1e6:>10.2f}")
+    if _counters:
+        lines.append(f"\n{'Counter':<32} {'Total':>14}")
+        lines.extend(f"{name:<32} {total:>14,}" for name, total in sorted(_counters.items()))
+    return "\n".join(lines)
+
+def enable(path):
+    """Turn tracing on from a CLI flag (decorators applied before this stay unwrapped)"""
+    global TRACE_PATH
+    if TRACE_PATH is None:
+        TRACE_PATH = path
+        atexit.register(_finish)
+
+def _finish():
+    # Only the process that started tracing exports; forked pool workers exit without atexit
+    script = os.path.basename(sys.argv[0]) or "python"
+    _spans.insert(0, (script, _origin_ns, time.perf_counter_ns() - _origin_ns, threading.main_thread().ident,
+                       {"argv": sys.argv[1:]}))
+    events = trace_events(script)
+    for path in _child_traces:
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                events.extend(json.load(f)["traceEvents"])
+            os.remove(path)
+    write_trace(TRACE_PATH, events)
+    print(f"\n{summary()}\n\nTrace written to '{TRACE_PATH}'", file=sys.stderr)
+
+if TRACE_PATH is not None:
+    atexit.register(_finish)
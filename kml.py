@@ -1,5 +1,6 @@
 from skyfield.api import EarthSatellite, load
-import simplekml
+from visibility import propagate_itrs, itrs_to_geodetic
+from kml_writer import KmlWriter
 
 # ISS TLE
 line1 = "1 25544U 98067A   24127.54791667  .00001764  00000+0  43262-4 0  9996"
@@ -9,21 +10,10 @@ sat = EarthSatellite(line1, line2, "ISS (ZARYA)")
 ts = load.timescale()
 times = ts.utc(2024, 5, 7, range(0, 90, 5))
 
-kml = simplekml.Kml()
-coords = []
+# Ground track as one time-stamped gx:Track (use export_kml.py for the whole catalog)
+lon, lat, _ = itrs_to_geodetic(propagate_itrs([sat], times))
 
-# Add points & collect coordinates for path
-for t in times:
-    sp = sat.at(t).subpoint()
-    lat = sp.latitude.degrees
-    lon = sp.longitude.degrees
-    coords.append((lon, lat))  # KML uses (lon, lat) format
-    kml.newpoint(name=str(t.utc_iso()), coords=[(lon, lat)])
-
-# Add the path as a LineString
-linestring = kml.newlinestring(name="ISS Orbit Path")
-linestring.coords = coords
-linestring.style.linestyle.width = 3
-linestring.style.linestyle.color = simplekml.Color.red  # Red path
-
-kml.save("iss_groundtrack.kml")
+with KmlWriter("iss_groundtrack.kml", name="ISS Ground Track") as kml:
+    kml.style("path", [255, 0, 0, 255], width=3)  # Red path
+    kml.track("ISS Orbit Path", times.utc_strftime("%Y-%m-%dT%H:%M:%SZ"), lon[0], lat[0],
+              style_id="path", altitude_mode="clampToGround")
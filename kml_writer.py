@@ -0,0 +1,166 @@
+from xml.sax.saxutils import escape
+from instrumentation import count
+import numpy as np
+import zipfile
+
+KML_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n')
+KML_FOOTER = '</kml>\n'
+
+def kml_color(rgba):
+    """KML aabbggrr hex color from an [r, g, b, a] list as used in the CZML scripts"""
+    r, g, b, a = rgba
+    return f"{a:02x}{b:02x}{g:02x}{r:02x}"
+
+class KmlWriter:
+    """
+    Streaming KML document writer. Placemarks are serialized as soon as
+    they are produced, so memory stays flat however long the tracks are.
+    A path ending in ".kmz" is written as a zip archive whose first member
+    is doc.kml; further KML files (e.g. tiles for NetworkLinks) can be
+    streamed into the same archive after this document is closed.
+    """
+
+    def __init__(self, path, name=None, archive=None, member="doc.kml"):
+        self.path = path
+        self.placemarks_written = 0
+        self.bytes_written = 0
+        self._archive = archive
+        if archive is None and path.endswith(".kmz"):
+            self._archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+            self._owns_archive = True
+        else:
+            self._owns_archive = False
+        if self._archive is not None:
+            self._file = self._archive.open(member, "w")
+        else:
+            self._file = open(path, "wb")
+        self._emit(KML_HEADER + "<Document>\n")
+        if name:
+            self._emit(f"<name>{escape(name)}</name>\n")
+
+    def _emit(self, text):
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def style(self, style_id, rgba, width=2, icon_scale=0.0):
+        """Shared line style; icon_scale 0 hides the per-sample track icon"""
+        self._emit(
+            f'<Style id="{escape(style_id)}"><IconStyle><scale>{icon_scale}</scale></IconStyle>'
+            f'<LineStyle><color>{kml_color(rgba)}</color><width>{width}</width></LineStyle></Style>\n'
+        )
+
+    def open_folder(self, name):
+        self._emit(f"<Folder><name>{escape(name)}</name>\n")
+
+    def close_folder(self):
+        self._emit("</Folder>\n")
+
+    def track(self, name, timestamps, lon, lat, altitude_m=None, style_id=None, altitude_mode="absolute"):
+        """One Placemark holding a time-stamped gx:Track for a whole sample sequence"""
+        parts = [f"<Placemark><name>{escape(name)}</name>"]
+        if style_id:
+            parts.append(f"<styleUrl>#{escape(style_id)}</styleUrl>")
+        parts.append(f"<gx:Track><altitudeMode>{altitude_mode}</altitudeMode>\n")
+        parts.extend(f"<when>{timestamp}</when>\n" for timestamp in timestamps)
+        if altitude_m is None:
+            parts.extend(f"<gx:coord>{x:.6f} {y:.6f} 0</gx:coord>\n" for x, y in zip(lon, lat))
+        else:
+            parts.extend(f"<gx:coord>{x:.6f} {y:.6f} {z:.1f}</gx:coord>\n" for x, y, z in zip(lon, lat, altitude_m))
+        parts.append("</gx:Track></Placemark>\n")
+        self._emit("".join(parts))
+        self.placemarks_written += 1
+
+    def network_link(self, name, href, bounds=None, begin=None, end=None, min_lod_pixels=128):
+        """
+        NetworkLink to another KML file, loaded only while its Region is in
+        view (bounds = (west, south, east, north) degrees) and, with begin and
+        end, only inside that time span
+        """
+        parts = [f"<NetworkLink><name>{escape(name)}</name>"]
+        if begin and end:
+            parts.append(f"<TimeSpan><begin>{begin}</begin><end>{end}</end></TimeSpan>")
+        if bounds:
+            west, south, east, north = bounds
+            parts.append(
+                f"<Region><LatLonAltBox><north>{north}</north><south>{south}</south>"
+                f"<east>{east}</east><west>{west}</west></LatLonAltBox>"
+                f"<Lod><minLodPixels>{min_lod_pixels}</minLodPixels></Lod></Region>"
+            )
+        parts.append(f"<Link><href>{escape(href)}</href><viewRefreshMode>onRegion</viewRefreshMode></Link>"
+                     "</NetworkLink>\n")
+        self._emit("".join(parts))
+        self.placemarks_written += 1
+
+    def close(self):
+        if self._file is not None:
+            self._emit("</Document>\n" + KML_FOOTER)
+            self._file.close()
+            self._file = None
+            count("kml placemarks", self.placemarks_written)
+            count("kml bytes written", self.bytes_written)
+            if self._owns_archive:
+                self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _runs(mask):
+    """(start, stop) index pairs of the runs of True in a 1-D boolean array"""
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8)))
+    return zip(edges[::2], edges[1::2])
+
+def write_tiled_kmz(path, name, sat_ids, timestamps, lon, lat, altitude_m, styles, style_of,
+                    step_minutes, tile_hours=6, tile_degrees=90):
+    """
+    Tiled KMZ for large constellations. Samples are split into time windows
+    of tile_hours and lon/lat tiles of tile_degrees; each non-empty tile is a
+    separate KML member holding the gx:Track pieces that fall inside it, and
+    doc.kml links to the tiles through Region and TimeSpan-limited
+    NetworkLinks so a viewer only loads what is on screen.
+    lon/lat/altitude_m have shape (satellite, time); styles maps style ids
+    to rgba colors and style_of gives the style id of each satellite.
+    Returns the number of tiles written.
+    """
+    steps_per_tile = max(1, int(round(tile_hours * 60 / step_minutes)))
+    n_times = len(timestamps)
+    n_lon_tiles = int(round(360 / tile_degrees))
+    n_lat_tiles = int(round(180 / tile_degrees))
+    lon_tile = ((lon + 180.0) // tile_degrees).clip(0, n_lon_tiles - 1)
+    lat_tile = ((lat + 90.0) // tile_degrees).clip(0, n_lat_tiles - 1)
+
+    tiles = []
+    for first in range(0, n_times, steps_per_tile):
+        window = slice(first, min(first + steps_per_tile, n_times))
+        for i in range(n_lon_tiles):
+            for j in range(n_lat_tiles):
+                inside = (lon_tile[:, window] == i) & (lat_tile[:, window] == j)
+                if inside.any():
+                    tiles.append((window, i, j, inside))
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        # doc.kml goes first: viewers treat the first KML member as the root
+        with KmlWriter(path, name=name, archive=archive) as root:
+            for window, i, j, _ in tiles:
+                west, south = -180 + i * tile_degrees, -90 + j * tile_degrees
+                root.network_link(
+                    f"{timestamps[window.start]} tile {i},{j}", f"tiles/{window.start}_{i}_{j}.kml",
+                    bounds=(west, south, west + tile_degrees, south + tile_degrees),
+                    begin=timestamps[window.start], end=timestamps[window.stop - 1]
+                )
+        for window, i, j, inside in tiles:
+            with KmlWriter(path, archive=archive, member=f"tiles/{window.start}_{i}_{j}.kml") as tile:
+                for style_id, rgba in styles.items():
+                    tile.style(style_id, rgba)
+                for s in np.flatnonzero(inside.any(axis=1)):
+                    for piece, (lo, hi) in enumerate(_runs(inside[s])):
+                        # Run on one sample past the tile edge so adjacent pieces join up
+                        columns = slice(window.start + lo, min(window.start + hi + 1, window.stop))
+                        tile.track(f"Satellite {sat_ids[s]}" + (f" ({piece + 1})" if piece else ""),
+                                   timestamps[columns], lon[s, columns], lat[s, columns],
+                                   altitude_m[s, columns], style_id=style_of[s])
+    return len(tiles)
@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import multiprocessing
+from sgp4.api import Satrec
+from visibility import propagate_satrecs, sgp4_times
+from instrumentation import traced
+import numpy as np
+import os
+
+DEFAULT_WORKERS = int(os.environ.get("SAT_PROPAGATION_WORKERS", 1))
+DEFAULT_SHARD_SIZE = 256
+
+def _propagate_shard(shm_name, shape, start, tles, jd, fraction, ut1_fraction):
+    """
+    Worker: propagate one shard of the catalog and write it straight into
+    its rows of the shared output array, so no positions are pickled back
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        satrecs = [Satrec.twoline2rv(line1, line2) for line1, line2 in tles]
+        out[start:start + len(tles)] = propagate_satrecs(satrecs, jd, fraction, ut1_fraction)
+        del out
+    finally:
+        shm.close()
+    return start
+
+def _pool_context():
+    # The generator scripts run at import time, so workers must be forked
+    # rather than spawned (spawn would re-run the calling script)
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+@traced("propagate_tles")
+def propagate_tles(tles, t, workers=DEFAULT_WORKERS, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Propagate a list of (line1, line2) TLE pairs over a skyfield Time array.
+    With workers > 1 the catalog is split into shards of `shard_size`
+    satellites that a process pool propagates in parallel into one shared
+    memory block. Rows always come back in input order, whatever order the
+    shards finish in.
+    Returns ITRS positions in km, shape (satellite, time, 3).
+    """
+    tles = [(line1.strip(), line2.strip()) for line1, line2 in tles]
+    jd, fraction, ut1_fraction = sgp4_times(t)
+    shape = (len(tles), len(jd), 3)
+
+    if workers is None:
+        workers = os.cpu_count()
+    if workers <= 1 or len(tles) <= shard_size:
+        satrecs = [Satrec.twoline2rv(line1, line2) for line1, line2 in tles]
+        return propagate_satrecs(satrecs, jd, fraction, ut1_fraction)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+            futures = [
+                pool.submit(_propagate_shard, shm.name, shape, start,
+                            tles[start:start + shard_size], jd, fraction, ut1_fraction)
+                for start in range(0, len(tles), shard_size)
+            ]
+            for future in futures:
+                future.result()
+        shared = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        positions = shared.copy()
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+    return positions
@@ -0,0 +1,195 @@
+from czml_writer import DEFAULT_GZIP
+from time_window import add_window_arguments, window_start, DEFAULT_STATION_FILE, TIMESTAMP_FORMAT
+import instrumentation
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("SAT_PIPELINE_CACHE", ".pipeline_cache")
+STATE_FILE = "workspace.json"
+
+def window_args(options):
+    return ["--tle-file", options.tle_file, "--station-file", options.station_file, "--start", options.start,
+            "--hours", str(options.hours), "--step-minutes", str(options.step_minutes)]
+
+def czml_output(path):
+    return path + ".gz" if DEFAULT_GZIP else path
+
+class Stage:
+    """
+    One script run in the pipeline. Its cache key hashes the script and the
+    local modules it imports, the contents of its input files, its command
+    line, output-affecting environment and the keys of the stages it
+    depends on, so any upstream change invalidates it.
+    """
+
+    def __init__(self, name, script, outputs, group, inputs=(), args=None, deps=()):
+        self.name = name
+        self.script = script
+        self.outputs = outputs
+        self.group = group
+        self.inputs = inputs
+        self.args = args or (lambda options: [])
+        self.deps = deps
+
+    def input_files(self, options):
+        placeholders = {"{tle_file}": options.tle_file, "{station_file}": options.station_file}
+        return [placeholders.get(path, path) for path in self.inputs]
+
+    def key(self, options, dep_keys):
+        digest = hashlib.sha256()
+        digest.update(self.name.encode())
+        for module in sorted(local_modules(self.script)):
+            digest.update(module.encode())
+            digest.update(_file_digest(os.path.join(SCRIPT_DIR, module)))
+        for path in self.input_files(options):
+            digest.update(path.encode())
+            digest.update(_file_digest(path))
+        digest.update(json.dumps(self.args(options)).encode())
+        digest.update(json.dumps(sorted((k, v) for k, v in os.environ.items() if k.startswith("SAT_CZML_"))).encode())
+        for dep_key in dep_keys:
+            digest.update(dep_key.encode())
+        return digest.hexdigest()
+
+STAGES = [
+    Stage("los", "calculate_los.py", ["visibility_data.npz"], "los",
+          inputs=["{tle_file}", "{station_file}"], args=window_args),
+    Stage("czml-los", "generate_los_visualization.py", [czml_output("combined_visualization.czml")], "czml",
+          inputs=["{tle_file}", "{station_file}"], args=window_args, deps=["los"]),
+    Stage("czml-virtual", "generate_czml.py", [czml_output("virtual_satellite_10000.czml")], "czml"),
+    Stage("czml-geo", "generate_czml2.py", [czml_output("multiple_satellites.czml")], "czml",
+          inputs=["geo_tles.txt"]),
+    Stage("czml-geo-models", "generate_czml3.py", [czml_output("czml_3d_satellites.json")], "czml",
+          inputs=["geo_tles.txt"]),
+    Stage("czml-rings", "generate_czml24.py", [czml_output("czml_3d_satellites_with_models.json")], "czml",
+          inputs=["satellite_tles.txt", DEFAULT_STATION_FILE]),
+    Stage("coverage", "coverage.py", ["coverage.npz"], "coverage",
+          inputs=["{tle_file}"], args=window_args),
+    Stage("crosslinks", "crosslinks.py", ["crosslinks.npz"], "crosslinks",
+          inputs=["{tle_file}", "{station_file}"], args=window_args),
+    Stage("kml-iss", "kml.py", ["iss_groundtrack.kml"], "kml"),
+    Stage("kml-attacker", "attacker.py", ["two_satellites.kml"], "kml"),
+    Stage("kml-catalog", "export_kml.py", ["satellites.kmz"], "kml",
+          inputs=["{tle_file}"], args=window_args),
+    Stage("proximity", "proximity.py", ["proximity_events.csv", "proximity_log_extended.txt"], "proximity",
+          args=lambda options: ["--sample-log"]),
+]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+def local_modules(script, seen=None):
+    """The script plus every module of this repo it imports, recursively"""
+    seen = set() if seen is None else seen
+    if script in seen:
+        return seen
+    seen.add(script)
+    with open(os.path.join(SCRIPT_DIR, script), "r") as f:
+        for name in re.findall(r"^\s*(?:from|import)\s+(\w+)", f.read(), re.MULTILINE):
+            if os.path.exists(os.path.join(SCRIPT_DIR, f"{name}.py")):
+                local_modules(f"{name}.py", seen)
+    return seen
+
+def resolve(names):
+    """Stages to run for the requested names, dependencies first"""
+    ordered = []
+
+    def visit(name):
+        stage = STAGES_BY_NAME[name]
+        for dep in stage.deps:
+            visit(dep)
+        if stage not in ordered:
+            ordered.append(stage)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+def _output_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def run(names, options, force=False):
+    """
+    Bring the outputs of the named stages up to date. A stage whose key
+    matches what is already in the workspace is skipped, one whose key is
+    in the cache is restored by copying, and only the rest are executed.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    state_path = os.path.join(CACHE_DIR, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            state = json.load(f)
+
+    keys = {}
+    for stage in resolve(names):
+        key = stage.key(options, [keys[dep] for dep in stage.deps])
+        keys[stage.name] = key
+        entry_dir = os.path.join(CACHE_DIR, stage.name, key)
+        current = state.get(stage.name, {})
+
+        in_workspace = (
+            current.get("key") == key
+            and all(os.path.exists(path) and _output_stamp(path) == current["stamps"].get(path)
+                    for path in stage.outputs)
+        )
+        if in_workspace and not force:
+            print(f"[{stage.name}] up to date")
+            continue
+
+        if os.path.isdir(entry_dir) and not force:
+            print(f"[{stage.name}] restored from cache")
+            with instrumentation.span(f"restore {stage.name}"):
+                for path in stage.outputs:
+                    shutil.copy2(os.path.join(entry_dir, os.path.basename(path)), path)
+        else:
+            command = [sys.executable, os.path.join(SCRIPT_DIR, stage.script)] + stage.args(options)
+            env = None
+            if instrumentation.enabled():
+                # Each stage traces into its own file, merged into the pipeline trace at exit
+                env = dict(os.environ, SAT_TRACE=f"{instrumentation.TRACE_PATH}.{stage.name}.tmp")
+                instrumentation.include_trace(env["SAT_TRACE"])
+            print(f"[{stage.name}] running {stage.script}")
+            with instrumentation.span(f"run {stage.name}"):
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL, env=env)
+            tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+            os.makedirs(tmp_dir, exist_ok=True)
+            for path in stage.outputs:
+                shutil.copy2(path, os.path.join(tmp_dir, os.path.basename(path)))
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+
+        state[stage.name] = {"key": key, "stamps": {path: _output_stamp(path) for path in stage.outputs}}
+        with open(state_path, "w") as f:
+            json.dump(state, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the visibility, CZML, coverage, crosslink, KML and proximity pipeline")
+    parser.add_argument("command", choices=["los", "czml", "coverage", "crosslinks", "kml", "proximity", "all"])
+    parser.add_argument("--force", action="store_true", help="re-run stages even if cached")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome-trace JSON of every stage run (same as setting SAT_TRACE)")
+    add_window_arguments(parser)
+    options = parser.parse_args()
+    if options.trace:
+        instrumentation.enable(options.trace)
+    # Resolve "now" once, so the stage keys move with the clock and every stage sees the same window
+    options.start = window_start(options).strftime(TIMESTAMP_FORMAT)
+
+    if options.command == "all":
+        names = [stage.name for stage in STAGES]
+    else:
+        names = [stage.name for stage in STAGES if stage.group == options.command]
+    run(names, options, force=options.force)
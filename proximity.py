@@ -1,5 +1,16 @@
 from skyfield.api import EarthSatellite, load
-from geopy.distance import geodesic
+from conjunction import refine_closest_approach
+from chebyshev_ephemeris import ChebyshevEphemeris
+from visibility import propagate_itrs, time_offsets
+import numpy as np
+import argparse
+
+parser = argparse.ArgumentParser(description="Victim/attacker proximity detection")
+parser.add_argument("--threshold-km", type=float, default=300,
+                    help="report close approaches with a miss distance under this range")
+parser.add_argument("--sample-log", action="store_true",
+                    help="also write every sample under the threshold to proximity_log_extended.txt")
+args = parser.parse_args()
 
 # Time and satellite setup
 ts = load.timescale()
@@ -17,19 +28,37 @@ attacker = EarthSatellite(line1_a, line2_a, "Attacker")
 # Simulate over 6 hours at 1-minute intervals
 times = ts.utc(2024, 5, 7, 0, range(0, 360, 1))  # every 1 min for 6 hrs
 
-log_file = open("proximity_log_extended.txt", "w")
-log_file.write("Time,Distance_km\n")
-
-# Proximity detection
-for t in times:
-    sp_v = victim.at(t).subpoint()
-    sp_a = attacker.at(t).subpoint()
-    coord_v = (sp_v.latitude.degrees, sp_v.longitude.degrees)
-    coord_a = (sp_a.latitude.degrees, sp_a.longitude.degrees)
-    distance_km = geodesic(coord_v, coord_a).km
-    if distance_km < 300:  # looser threshold to capture more events
-        log_line = f"{t.utc_iso()},{distance_km:.2f}\n"
-        print(f"[PROXIMITY] {log_line.strip()}")
-        log_file.write(log_line)
-
-log_file.close()
+# True 3D range over the whole time array in one batch
+positions = propagate_itrs([victim, attacker], times)
+distance_km = np.linalg.norm(positions[0] - positions[1], axis=1)
+
+# Each interior local minimum of the sampled range brackets one approach
+is_minimum = (distance_km[1:-1] <= distance_km[:-2]) & (distance_km[1:-1] < distance_km[2:])
+samples = np.flatnonzero(is_minimum) + 1
+
+# Refine each approach by root-finding on the range-rate, evaluating a
+# Chebyshev fit of both orbits instead of SGP4 at every bisection step
+epoch, offsets = time_offsets(times)
+ephemeris = ChebyshevEphemeris([victim.model, attacker.model], epoch, offsets[-1])
+tca, miss_distance, relative_speed = refine_closest_approach(
+    [victim.model, attacker.model],
+    np.zeros(len(samples), dtype=int), np.ones(len(samples), dtype=int), epoch,
+    offsets[samples - 1], offsets[samples + 1], ephemeris=ephemeris
+)
+close = miss_distance < args.threshold_km
+tca_times = ts.tt_jd(times[0].tt + tca[close] / 86400.0)
+
+with open("proximity_events.csv", "w") as f:
+    f.write("TCA,Miss_Distance_km,Relative_Velocity_km_s\n")
+    for timestamp, miss, speed in zip(tca_times.utc_strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                                      miss_distance[close], relative_speed[close]):
+        line = f"{timestamp},{miss:.3f},{speed:.4f}"
+        print(f"[PROXIMITY] {line}")
+        f.write(line + "\n")
+
+if args.sample_log:
+    logged = distance_km < args.threshold_km
+    with open("proximity_log_extended.txt", "w") as log_file:
+        log_file.write("Time,Distance_km\n")
+        for timestamp, distance in zip(times[logged].utc_strftime("%Y-%m-%dT%H:%M:%SZ"), distance_km[logged]):
+            log_file.write(f"{timestamp},{distance:.2f}\n")
@@ -1,27 +1,84 @@
-import matplotlib.pyplot as plt
-from datetime import datetime
-
-timestamps = []
-distances = []
-
-# Read the log file
-with open("proximity_log_extended.txt", "r") as f:
-    next(f)  # skip header
-    for line in f:
-        time_str, distance = line.strip().split(",")
-        timestamps.append(datetime.fromisoformat(time_str.replace("Z", "+00:00")))
-        distances.append(float(distance))
-
-# Plot proximity events
-plt.figure(figsize=(10, 5))
-plt.plot(timestamps, distances, marker='o', linestyle='-', color='red')
-plt.axhline(100, color='gray', linestyle='--', label='Proximity Threshold (100km)')
-plt.title("Satellite Proximity Events")
-plt.xlabel("Time")
-plt.ylabel("Distance (km)")
-plt.xticks(rotation=45)
-plt.grid(True)
-plt.legend()
-plt.tight_layout()
-plt.savefig("proximity_plot.png")
-plt.show()
+import numpy as np
+import argparse
+import matplotlib
+
+def read_log(path):
+    """
+    Parse a Time,Distance_km log into datetime64[ms] and float64 arrays.
+    NumPy's C reader converts the whole file without a Python object per
+    line; the "Z" suffixes are blanked in the raw timestamp bytes, which
+    NumPy then parses in one vectorized cast.
+    """
+    rows = np.loadtxt(path, delimiter=",", skiprows=1, comments=None, ndmin=1,
+                      dtype=[("time", "S32"), ("distance", np.float64)])
+    raw = np.ascontiguousarray(rows["time"])
+    raw_bytes = raw.view(np.uint8)
+    raw_bytes[raw_bytes == ord("Z")] = 0
+    return raw.astype("datetime64[ms]"), rows["distance"]
+
+def decimate_min_max(times, values, bins):
+    """
+    Reduce a time series to at most two samples per bin of equal time
+    width: the minimum and the maximum, at their own timestamps and in time
+    order. Extremes, such as the closest approach, survive at any zoom level
+    of the plot the bins are sized for.
+    Returns (times, values, sample indices).
+    """
+    if len(times) <= 2 * bins:
+        return times, values, np.arange(len(times))
+    order = np.argsort(times, kind="stable") if np.any(times[1:] < times[:-1]) else np.arange(len(times))
+    t = times[order].astype(np.int64)
+    v = values[order]
+    span = max(int(t[-1] - t[0]), 1)
+    column = np.minimum((t - t[0]) * bins // span, bins - 1)
+    starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+    counts = np.diff(np.r_[starts, len(t)])
+
+    picked = []
+    for extreme in (np.minimum, np.maximum):
+        # First sample in each bin equal to the bin's extreme
+        hits = np.flatnonzero(v == np.repeat(extreme.reduceat(v, starts), counts))
+        _, first = np.unique(column[hits], return_index=True)
+        picked.append(hits[first])
+    keep = np.unique(np.concatenate(picked))
+    return times[order[keep]], values[order[keep]], order[keep]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot proximity log distances over time")
+    parser.add_argument("--log", default="proximity_log_extended.txt")
+    parser.add_argument("--output", default="proximity_plot.png")
+    parser.add_argument("--threshold-km", type=float, default=100)
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--show", action="store_true", help="also open an interactive window")
+    args = parser.parse_args()
+
+    if not args.show:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    timestamps, distances = read_log(args.log)
+
+    # One min/max pair per horizontal pixel of the axes
+    plt.figure(figsize=(10, 5), dpi=args.dpi)
+    plot_times, plot_distances, _ = decimate_min_max(timestamps, distances, 10 * args.dpi)
+    decimated = len(plot_times) < len(timestamps)
+
+    # Plot proximity events
+    plt.plot(plot_times, plot_distances, marker=None if decimated else 'o', linestyle='-', color='red')
+    plt.axhline(args.threshold_km, color='gray', linestyle='--',
+                label=f'Proximity Threshold ({args.threshold_km:g}km)')
+    if len(distances):
+        closest = np.argmin(distances)
+        plt.scatter([timestamps[closest]], [distances[closest]], color='black', zorder=3,
+                    label=f'Closest approach ({distances[closest]:.2f}km)')
+    plt.title("Satellite Proximity Events")
+    plt.xlabel("Time")
+    plt.ylabel("Distance (km)")
+    plt.xticks(rotation=45)
+    plt.grid(True)
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(args.output)
+    print(f"Plotted {len(plot_times)} of {len(timestamps)} samples to '{args.output}'")
+    if args.show:
+        plt.show()
@@ -1,27 +1,20 @@
 import time
-import hashlib
+import secrets
+from command_validator import CommandValidator, create_command
 
-# Simulated secure command structure
-def create_command(cmd_str, timestamp):
-    token = hashlib.sha256((cmd_str + str(timestamp)).encode()).hexdigest()
-    return {"command": cmd_str, "timestamp": timestamp, "token": token}
-
-# Detection logic
-def validate_command(received, current_time, time_window=60):
-    expected_token = hashlib.sha256((received["command"] + str(received["timestamp"])).encode()).hexdigest()
-    if received["token"] != expected_token:
-        return False, "Token mismatch"
-    if abs(current_time - received["timestamp"]) > time_window:
-        return False, "Stale command (possible replay)"
-    return True, "Valid"
+# Shared secret between mission control and the ground station
+key = secrets.token_bytes(32)
+validator = CommandValidator(key, window=60)
 
 # Original command
-orig_cmd = create_command("SET_POWER_LOW", int(time.time()))
+orig_cmd = create_command(key, "SET_POWER_LOW", int(time.time()))
 print("Sent command:", orig_cmd)
+valid, reason = validator.validate(orig_cmd, int(time.time()))
+print(f"Original validation result: {valid} | Reason: {reason}")
 
 # Wait (simulate attacker replay)
 time.sleep(5)  # Replace with longer time for stale/replay
 
-# Replay attempt
-valid, reason = validate_command(orig_cmd, int(time.time()))
+# Replay attempt, rejected whether or not it is still inside the time window
+valid, reason = validator.validate(orig_cmd, int(time.time()))
 print(f"Replay validation result: {valid} | Reason: {reason}")
@@ -0,0 +1,150 @@
+from skyfield.api import load, utc
+from datetime import datetime, timedelta
+from parallel_propagation import propagate_tles
+from visibility import DAY_S
+from time_window import add_window_arguments, window_start
+from tle_catalog import load_catalog
+from station_registry import load_stations
+from visibility_store import VisibilityStore, write_contacts, write_samples, SAMPLE_DTYPE
+from instrumentation import traced
+import numpy as np
+import argparse
+import hashlib
+import os
+
+DEFAULT_SEGMENT_DIR = os.environ.get("SAT_VISIBILITY_SEGMENTS", ".visibility_segments")
+DEFAULT_CHUNK_MINUTES = 60
+SEGMENT_FORMAT = "%Y%m%dT%H%M%SZ"
+UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+
+def segment_key(tles, stations, step_minutes):
+    """Everything a segment's contents depend on apart from its time span"""
+    digest = hashlib.sha256()
+    for line1, line2 in tles:
+        digest.update(f"{line1.strip()}\n{line2.strip()}\n".encode())
+    digest.update(stations.records.tobytes())
+    digest.update(f"{step_minutes!r}".encode())
+    return digest.hexdigest()
+
+class RollingVisibility:
+    """
+    Visibility for a moving window, stored as fixed-length time chunks
+    aligned to the Unix epoch, offset by the window start's phase within a
+    step so every chunk sample falls on the window's start + k * step grid.
+    Each chunk is one columnar segment file, so advancing the window by
+    whole steps only computes the chunks that have come into view and
+    deletes the ones that have fallen behind it.
+    """
+
+    def __init__(self, tles, stations, sat_ids, step_minutes,
+                 chunk_minutes=DEFAULT_CHUNK_MINUTES, directory=DEFAULT_SEGMENT_DIR):
+        if chunk_minutes % step_minutes:
+            raise ValueError(f"chunk length {chunk_minutes} min is not a multiple of the {step_minutes} min step")
+        self.tles = list(tles)
+        self.stations = stations
+        self.station_ids = stations.ids
+        self.sat_ids = list(sat_ids)
+        self.step = timedelta(minutes=step_minutes)
+        self.chunk = timedelta(minutes=chunk_minutes)
+        self.directory = directory
+        self.segment_dir = os.path.join(
+            directory, segment_key(self.tles, stations, step_minutes)
+        )
+
+    def chunk_starts(self, start, hours):
+        """Start times of the chunks overlapping [start, start + hours), on start's step grid"""
+        end = start + timedelta(hours=hours)
+        origin = UNIX_EPOCH + (start - UNIX_EPOCH) % self.step
+        first = origin + (start - origin) // self.chunk * self.chunk
+        starts = []
+        while first < end:
+            starts.append(first)
+            first += self.chunk
+        return starts
+
+    def segment_path(self, chunk_start):
+        return os.path.join(self.segment_dir, f"{chunk_start.strftime(SEGMENT_FORMAT)}.npz")
+
+    @traced("rolling_visibility.segment")
+    def compute_segment(self, ts, chunk_start):
+        """Propagate one chunk and write its visible samples"""
+        times = [chunk_start + i * self.step for i in range(self.chunk // self.step)]
+        t = ts.from_datetimes(times)
+        positions = propagate_tles(self.tles, t)
+        write_contacts(self.segment_path(chunk_start), self.station_ids, self.sat_ids, chunk_start,
+                       (t.tt - t[0].tt) * DAY_S, self.stations.contacts(positions))
+
+    def prune(self, start):
+        """Delete segments, for any catalog or station set, that end before start"""
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for key in os.listdir(self.directory):
+            segment_dir = os.path.join(self.directory, key)
+            for name in os.listdir(segment_dir):
+                try:
+                    chunk_start = datetime.strptime(name[:-4], SEGMENT_FORMAT).replace(tzinfo=utc)
+                except ValueError:
+                    continue
+                if chunk_start + self.chunk <= start:
+                    os.remove(os.path.join(segment_dir, name))
+                    removed += 1
+            if not os.listdir(segment_dir):
+                os.rmdir(segment_dir)
+        return removed
+
+    def update(self, ts, start, hours):
+        """
+        Make sure every chunk of the window is on disk, computing only the
+        missing ones, and drop expired chunks. Returns the number of chunks
+        computed and removed.
+        """
+        removed = self.prune(start)
+        os.makedirs(self.segment_dir, exist_ok=True)
+        computed = 0
+        for chunk_start in self.chunk_starts(start, hours):
+            if not os.path.exists(self.segment_path(chunk_start)):
+                self.compute_segment(ts, chunk_start)
+                computed += 1
+        return computed, removed
+
+    def merge(self, path, start, hours):
+        """Write the window's samples from its segments as one visibility file starting at start"""
+        window = timedelta(hours=hours).total_seconds()
+        parts = []
+        for chunk_start in self.chunk_starts(start, hours):
+            samples = np.array(VisibilityStore(self.segment_path(chunk_start)).samples)
+            samples['time'] += int((chunk_start - start).total_seconds())
+            parts.append(samples[(samples['time'] >= 0) & (samples['time'] < window)])
+        samples = np.concatenate(parts) if parts else np.zeros(0, dtype=SAMPLE_DTYPE)
+        write_samples(path, self.station_ids, self.sat_ids, start, samples)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check merged rolling visibility against a full recompute")
+    parser.add_argument("--chunk-minutes", type=float, default=DEFAULT_CHUNK_MINUTES)
+    # Off the chunk and step grids by default, the case the merge has to realign
+    add_window_arguments(parser, hours=3)
+    parser.set_defaults(start="2024-05-08T00:03:00Z")
+    args = parser.parse_args()
+
+    ts = load.timescale()
+    catalog = load_catalog(args.tle_file)
+    stations = load_stations(args.station_file)
+    start_time = window_start(args)
+    rolling = RollingVisibility(catalog.tles(), stations, catalog.sat_ids, args.step_minutes, args.chunk_minutes)
+    rolling.update(ts, start_time, args.hours)
+    rolling.merge("rolling_check.npz", start_time, args.hours)
+    merged = np.array(VisibilityStore("rolling_check.npz").samples)
+
+    num_steps = int(args.hours * 60 // args.step_minutes)
+    t = ts.from_datetimes([start_time + timedelta(minutes=i * args.step_minutes) for i in range(num_steps)])
+    write_contacts("rolling_check.npz", stations.ids, catalog.sat_ids, start_time, (t.tt - t[0].tt) * DAY_S,
+                   stations.contacts(propagate_tles(catalog.tles(), t)))
+    full = np.array(VisibilityStore("rolling_check.npz").samples)
+    os.remove("rolling_check.npz")
+
+    same = (len(merged) == len(full)
+            and all(np.array_equal(merged[name], full[name]) for name in ('station', 'sat', 'time'))
+            and np.allclose(merged['elevation'], full['elevation'], atol=1e-3))
+    print(f"{len(merged)} merged samples, {len(full)} from a full recompute: {'match' if same else 'MISMATCH'}")
+    raise SystemExit(0 if same else 1)
@@ -0,0 +1,157 @@
+from skyfield.api import wgs84
+from visibility import geodetic_to_itrs, pairwise_elevations, footprint_half_angle, is_visible
+from time_window import DEFAULT_STATION_FILE
+from instrumentation import traced
+import numpy as np
+import csv
+import json
+
+DEFAULT_COLOR = [255, 0, 0, 255]
+# Covers the tilt of a station's geodetic zenith from its geocentric direction
+CULL_MARGIN_DEG = 0.5
+
+STATION_DTYPE = np.dtype([
+    ('station_id', 'U32'),
+    ('name', 'U64'),
+    ('lat', np.float64),
+    ('lon', np.float64),
+    ('height_m', np.float64),
+    ('min_elevation', np.float64),
+    ('color', np.uint8, (4,))
+])
+
+def load_stations(path=DEFAULT_STATION_FILE, cell_deg=2.0):
+    """
+    Load a station registry. JSON files use the {station_id: {name,
+    coordinates: [lat, lon], color, min_elevation, height_m}} layout of
+    ground_stations.json; CSV files need a header with station_id, lat and
+    lon and may add name, height_m and min_elevation columns. The elevation
+    mask defaults to 10 degrees and the height to 0.
+    """
+    rows = []
+    if path.endswith(".csv"):
+        with open(path, "r", newline="") as f:
+            for entry in csv.DictReader(f):
+                rows.append((
+                    entry["station_id"], entry.get("name") or entry["station_id"],
+                    float(entry["lat"]), float(entry["lon"]), float(entry.get("height_m") or 0.0),
+                    float(entry.get("min_elevation") or 10.0), DEFAULT_COLOR
+                ))
+    else:
+        with open(path, "r") as f:
+            for station_id, station in json.load(f).items():
+                lat, lon = station["coordinates"]
+                rows.append((
+                    station_id, station.get("name", station_id), lat, lon, station.get("height_m", 0.0),
+                    station.get("min_elevation", 10.0), station.get("color", DEFAULT_COLOR)
+                ))
+    return StationRegistry(np.array(rows, dtype=STATION_DTYPE), cell_deg=cell_deg)
+
+class StationRegistry:
+    """
+    Array-backed set of ground stations with per-station elevation masks.
+    Stations are bucketed into lat/lon cells, each bounded by a ball (center
+    direction plus the angular radius of its farthest station), so contact
+    searches test a satellite's footprint cone against occupied cells and
+    only evaluate elevation for stations in the cells it reaches.
+    """
+
+    def __init__(self, records, cell_deg=2.0):
+        self.records = records
+        self.positions, self.zenith = geodetic_to_itrs(records['lat'], records['lon'], records['height_m'] / 1000.0)
+        self._build_index(cell_deg)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def ids(self):
+        return [str(s) for s in self.records['station_id']]
+
+    @property
+    def min_elevation(self):
+        return self.records['min_elevation']
+
+    def index_of(self, station_id):
+        matches = np.flatnonzero(self.records['station_id'] == station_id)
+        if not len(matches):
+            raise KeyError(station_id)
+        return int(matches[0])
+
+    def as_dict(self):
+        """{station_id: {name, coordinates, color, min_elevation}}, the layout the scripts use"""
+        return {
+            str(r['station_id']): {
+                "name": str(r['name']),
+                "coordinates": [float(r['lat']), float(r['lon'])],
+                "color": [int(c) for c in r['color']],
+                "min_elevation": float(r['min_elevation'])
+            }
+            for r in self.records
+        }
+
+    def topos(self):
+        """wgs84 GeographicPosition objects for code that needs skyfield positions"""
+        return [wgs84.latlon(r['lat'], r['lon'], elevation_m=r['height_m']) for r in self.records]
+
+    def _build_index(self, cell_deg):
+        directions = self.positions / np.linalg.norm(self.positions, axis=1)[:, None]
+        n_lon = int(np.ceil(360.0 / cell_deg))
+        row = np.clip(((self.records['lat'] + 90.0) // cell_deg).astype(int), 0, None)
+        col = (((self.records['lon'] + 180.0) % 360.0) // cell_deg).astype(int)
+        cell = row * n_lon + col
+
+        self._order = np.argsort(cell, kind='stable')
+        occupied, self._cell_start, self._cell_count = np.unique(cell[self._order], return_index=True,
+                                                                 return_counts=True)
+        # Ball per occupied cell: mean direction and angle to its farthest station
+        sums = np.add.reduceat(directions[self._order], self._cell_start, axis=0) if len(occupied) else directions
+        self._centers = sums / np.linalg.norm(sums, axis=1)[:, None]
+        cos_to_center = np.einsum('ij,ij->i', directions[self._order],
+                                  np.repeat(self._centers, self._cell_count, axis=0))
+        self._radius = np.degrees(np.arccos(np.clip(
+            np.minimum.reduceat(cos_to_center, self._cell_start) if len(occupied) else cos_to_center, -1.0, 1.0
+        )))
+
+    def candidates(self, sub_directions, half_angle):
+        """
+        (satellite row, station) index pairs whose station may lie inside the
+        footprint cone of half_angle degrees around each unit sub-direction
+        """
+        limit = np.radians(np.clip(half_angle[:, None] + self._radius[None, :], 0.0, 180.0))
+        sat, cell = np.nonzero(sub_directions @ self._centers.T >= np.cos(limit))
+        count = self._cell_count[cell]
+        run_start = np.repeat(np.cumsum(count) - count, count)
+        offset = np.arange(count.sum()) - run_start
+        return np.repeat(sat, count), self._order[np.repeat(self._cell_start[cell], count) + offset]
+
+    @traced("stations.contacts")
+    def contacts(self, satellite_positions, chunk_elements=1 << 22):
+        """
+        Every (satellite, station, time) sample above that station's
+        elevation mask, for ITRS positions of shape (satellite, time, 3).
+        Work grows with satellites x occupied cells plus the number of
+        candidate pairs, not satellites x stations.
+        Returns (sat, station, time, elevation) arrays ordered by time.
+        """
+        n_sat, n_times = satellite_positions.shape[:2]
+        radius = np.linalg.norm(satellite_positions, axis=-1)
+        directions = satellite_positions / radius[..., None]
+        half_angle = footprint_half_angle(satellite_positions, self.min_elevation.min()) + CULL_MARGIN_DEG
+        chunk = max(1, chunk_elements // max(len(self._centers), 1))
+
+        found = []
+        for k in range(n_times):
+            for first in range(0, n_sat, chunk):
+                rows = np.arange(first, min(first + chunk, n_sat))
+                rows = rows[np.isfinite(half_angle[rows, k])]
+                sat, station = self.candidates(directions[rows, k], half_angle[rows, k])
+                sat = rows[sat]
+                elevation = pairwise_elevations(satellite_positions[sat, k], self.positions[station],
+                                                self.zenith[station])
+                visible = is_visible(elevation, self.min_elevation[station])
+                found.append((sat[visible], station[visible], np.full(np.count_nonzero(visible), k),
+                               elevation[visible]))
+        if not found:
+            return tuple(np.zeros(0, dtype=dtype) for dtype in (int, int, int, float))
+        return tuple(np.concatenate(column) for column in zip(*found))
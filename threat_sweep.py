@@ -0,0 +1,180 @@
+from skyfield.api import load
+from sgp4.api import Satrec
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from parallel_propagation import _pool_context
+from conjunction import refine_closest_approach
+from tle_catalog import tle_checksum
+from time_window import window_start
+from visibility import propagate_satrecs, sgp4_times, time_offsets
+from instrumentation import span
+import numpy as np
+import argparse
+import os
+
+# Victim (ISS) and the attacker bus the variants are built from, as in proximity.py
+VICTIM_TLE = ("1 25544U 98067A   24127.54791667  .00001764  00000+0  43262-4 0  9996",
+              "2 25544  51.6448  81.1126 0004062 132.3403  38.2068 15.50620765393018")
+ATTACKER_LINE1 = "1 99999U 24001A   24127.54791667  .00001764  00000+0  50000-4 0  9990"
+
+VARIANT_DTYPE = np.dtype([
+    ('variant', np.int32),
+    ('inclination', np.float64),
+    ('raan', np.float64),
+    ('mean_anomaly', np.float64),
+    ('mean_motion', np.float64),
+    ('min_distance_km', np.float64),
+    ('tca', np.float64),                # seconds from the window start
+    ('relative_speed_km_s', np.float64),
+    ('proximity_minutes', np.float64),
+    ('first_approach', np.float64)      # seconds from the window start, NaN if never inside the threshold
+])
+
+def perturbed_elements(count, inclination_span=5.0, raan_span=5.0, mean_anomaly_span=10.0,
+                       mean_motion_span=0.05, seed=0, victim=VICTIM_TLE):
+    """
+    `count` attacker orbits around the victim's elements, each of
+    inclination, RAAN, mean anomaly (degrees) and mean motion (rev/day)
+    drawn uniformly within +/- its span. Returns a VARIANT_DTYPE array
+    with the element columns filled in.
+    """
+    line2 = victim[1]
+    rng = np.random.default_rng(seed)
+    variants = np.zeros(count, dtype=VARIANT_DTYPE)
+    variants['variant'] = np.arange(count)
+    variants['inclination'] = np.clip(float(line2[8:16]) + rng.uniform(-1, 1, count) * inclination_span, 0.0, 180.0)
+    variants['raan'] = (float(line2[17:25]) + rng.uniform(-1, 1, count) * raan_span) % 360.0
+    variants['mean_anomaly'] = (float(line2[43:51]) + rng.uniform(-1, 1, count) * mean_anomaly_span) % 360.0
+    variants['mean_motion'] = float(line2[52:63]) + rng.uniform(-1, 1, count) * mean_motion_span
+    return variants
+
+def variant_tle(row, victim=VICTIM_TLE):
+    """TLE pair for one variant: the attacker's line 1 and the victim's line 2 with the swept fields replaced"""
+    base = victim[1]
+    line2 = (f"2 99999 {row['inclination']:8.4f} {row['raan']:8.4f} {base[26:33]} {base[34:42]} "
+             f"{row['mean_anomaly']:8.4f} {row['mean_motion']:11.8f}{base[63:68]}")
+    line1 = ATTACKER_LINE1[:68]
+    return line1 + str(tle_checksum(line1)), line2 + str(tle_checksum(line2))
+
+def _sweep_block(variants, times, epoch, offsets, step_minutes, threshold_km, victim):
+    """
+    Worker: propagate the victim and one block of variants in a single SGP4
+    batch and reduce each variant's range history to its metrics
+    """
+    jd, fraction, ut1_fraction = times
+    satrecs = [Satrec.twoline2rv(*victim)] + [Satrec.twoline2rv(*variant_tle(row, victim)) for row in variants]
+    positions = propagate_satrecs(satrecs, jd, fraction, ut1_fraction)
+    distance = np.linalg.norm(positions[1:] - positions[:1], axis=-1)
+    distance = np.where(np.isfinite(distance), distance, np.inf)
+
+    inside = distance < threshold_km
+    variants = variants.copy()
+    variants['proximity_minutes'] = inside.sum(axis=1) * step_minutes
+    variants['first_approach'] = np.where(inside.any(axis=1), offsets[np.argmax(inside, axis=1)], np.nan)
+
+    # Every local minimum of the sampled range (window ends included) brackets
+    # one approach; the deepest sample need not hide the deepest approach
+    padded = np.pad(distance, ((0, 0), (1, 1)), constant_values=np.inf)
+    is_minimum = (distance <= padded[:, :-2]) & (distance < padded[:, 2:]) & np.isfinite(distance)
+    row, k = np.nonzero(is_minimum)
+    last = len(offsets) - 1
+    tca, miss, speed = refine_closest_approach(
+        satrecs, row + 1, np.zeros(len(row), dtype=int), epoch,
+        offsets[np.maximum(k - 1, 0)], offsets[np.minimum(k + 1, last)]
+    )
+    miss = np.where(np.isfinite(miss), miss, np.inf)
+
+    # Keep the smallest refined miss of each variant
+    variants['min_distance_km'] = np.inf
+    variants['tca'] = np.nan
+    variants['relative_speed_km_s'] = np.nan
+    order = np.lexsort((miss, row))
+    first = order[np.r_[True, row[order][1:] != row[order][:-1]]] if len(order) else order
+    variants['min_distance_km'][row[first]] = miss[first]
+    variants['tca'][row[first]] = tca[first]
+    variants['relative_speed_km_s'][row[first]] = speed[first]
+    return variants
+
+def sweep(variants, t, threshold_km=100.0, workers=None, block_size=500, victim=VICTIM_TLE):
+    """
+    Metrics for every variant over the evenly spaced Time array t: minimum
+    approach distance (refined between samples), time spent within
+    threshold_km and the first sample inside it. Blocks of block_size
+    variants are spread over `workers` processes (all cores by default),
+    so memory stays at one block's positions per worker.
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    times = sgp4_times(t)
+    epoch, offsets = time_offsets(t)
+    step_minutes = (offsets[1] - offsets[0]) / 60.0 if len(offsets) > 1 else 0.0
+    blocks = [variants[start:start + block_size] for start in range(0, len(variants), block_size)]
+    work = (times, epoch, offsets, step_minutes, threshold_km, victim)
+
+    with span("threat_sweep.sweep", variants=len(variants), workers=workers):
+        if workers <= 1 or len(blocks) == 1:
+            results = [_sweep_block(block, *work) for block in blocks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+                results = list(pool.map(_sweep_block, blocks, *[[item] * len(blocks) for item in work]))
+    return np.concatenate(results) if results else variants[:0]
+
+RANK_KEYS = {
+    # Closest approach first, longest exposure breaking ties
+    "min-distance": lambda v: np.lexsort((-v['proximity_minutes'], v['min_distance_km'])),
+    "proximity-time": lambda v: np.lexsort((v['min_distance_km'], -v['proximity_minutes'])),
+    "first-approach": lambda v: np.lexsort((v['min_distance_km'], np.nan_to_num(v['first_approach'], nan=np.inf)))
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep of attacker orbits around the victim")
+    parser.add_argument("--variants", type=int, default=10000)
+    parser.add_argument("--inclination-span", type=float, default=5.0, help="+/- degrees")
+    parser.add_argument("--raan-span", type=float, default=5.0, help="+/- degrees")
+    parser.add_argument("--mean-anomaly-span", type=float, default=10.0, help="+/- degrees")
+    parser.add_argument("--mean-motion-span", type=float, default=0.05, help="+/- revolutions per day")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold-km", type=float, default=100.0, help="proximity range")
+    parser.add_argument("--start", default="2024-05-07T00:00:00Z", help="window start, YYYY-MM-DDTHH:MM:SSZ or 'now'")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--step-seconds", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--rank-by", choices=sorted(RANK_KEYS), default="min-distance")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", default="threat_sweep.csv")
+    args = parser.parse_args()
+
+    ts = load.timescale()
+    start_time = window_start(args)
+    steps = int(args.hours * 3600 // args.step_seconds) + 1
+    t = ts.from_datetimes([start_time + timedelta(seconds=i * args.step_seconds) for i in range(steps)])
+
+    variants = perturbed_elements(args.variants, args.inclination_span, args.raan_span,
+                                  args.mean_anomaly_span, args.mean_motion_span, args.seed)
+    print(f"Sweeping {len(variants)} attacker orbits over {args.hours:g} hours at {args.step_seconds:g} s...")
+    results = sweep(variants, t, args.threshold_km, workers=args.workers)
+    ranked = results[RANK_KEYS[args.rank_by](results)]
+
+    def timestamp(seconds):
+        if not np.isfinite(seconds):
+            return ""
+        # Offsets carry float noise from the TT difference; milliseconds are plenty
+        return (start_time + timedelta(seconds=round(float(seconds), 3))).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+    with open(args.output, "w") as f:
+        f.write("Rank,Variant,Inclination,RAAN,Mean_Anomaly,Mean_Motion,Min_Distance_km,TCA,"
+                "Relative_Velocity_km_s,Proximity_Minutes,First_Approach\n")
+        for rank, row in enumerate(ranked, 1):
+            f.write(f"{rank},{row['variant']},{row['inclination']:.4f},{row['raan']:.4f},{row['mean_anomaly']:.4f},"
+                    f"{row['mean_motion']:.8f},{row['min_distance_km']:.3f},{timestamp(row['tca'])},"
+                    f"{row['relative_speed_km_s']:.4f},{row['proximity_minutes']:g},{timestamp(row['first_approach'])}\n")
+
+    print(f"\n{'Rank':>4} {'Variant':>7} {'Incl':>8} {'RAAN':>8} {'M':>8} {'n rev/d':>11} "
+          f"{'Miss km':>9} {'Prox min':>8}  First approach")
+    for rank, row in enumerate(ranked[:args.top], 1):
+        print(f"{rank:>4} {row['variant']:>7} {row['inclination']:>8.4f} {row['raan']:>8.4f} "
+              f"{row['mean_anomaly']:>8.4f} {row['mean_motion']:>11.8f} {row['min_distance_km']:>9.3f} "
+              f"{row['proximity_minutes']:>8g}  {timestamp(row['first_approach']) or '-'}")
+    threatening = np.count_nonzero(results['proximity_minutes'] > 0)
+    print(f"\n{threatening} of {len(results)} variants came within {args.threshold_km:g} km")
+    print(f"Sweep results have been saved to '{args.output}'")
@@ -0,0 +1,25 @@
+from skyfield.api import utc
+from datetime import datetime
+import os
+
+DEFAULT_START = "2024-05-08T00:00:00Z"
+DEFAULT_STATION_FILE = os.environ.get("SAT_STATION_FILE", "ground_stations.json")
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+def add_window_arguments(parser, hours=24, step_minutes=5):
+    """
+    TLE file, station registry and time window options shared by the
+    scripts the pipeline drives, so one set of values describes a run end
+    to end
+    """
+    parser.add_argument("--tle-file", default="satellite_tles.txt")
+    parser.add_argument("--station-file", default=DEFAULT_STATION_FILE,
+                        help="ground station registry, JSON or CSV (see station_registry.py)")
+    parser.add_argument("--start", default=DEFAULT_START, help="window start, YYYY-MM-DDTHH:MM:SSZ or 'now'")
+    parser.add_argument("--hours", type=float, default=hours, help="window length")
+    parser.add_argument("--step-minutes", type=float, default=step_minutes, help="sample spacing")
+
+def window_start(args):
+    if args.start == "now":
+        return datetime.now(tz=utc).replace(second=0, microsecond=0)
+    return datetime.strptime(args.start, TIMESTAMP_FORMAT).replace(tzinfo=utc)
@@ -0,0 +1,166 @@
+from skyfield.api import EarthSatellite
+import numpy as np
+import hashlib
+import warnings
+import os
+
+DEFAULT_CACHE_DIR = os.environ.get("SAT_TLE_CACHE", ".tle_cache")
+
+CATALOG_DTYPE = np.dtype([
+    ('sat_id', 'U5'),
+    ('name', 'U24'),
+    ('line1', 'S69'),
+    ('line2', 'S69'),
+    ('inclination', np.float64),
+    ('raan', np.float64),
+    ('eccentricity', np.float64),
+    ('arg_perigee', np.float64),
+    ('mean_anomaly', np.float64),
+    ('mean_motion', np.float64),
+    ('checksum_ok', np.bool_)
+])
+
+def tle_checksum(line):
+    """Modulo-10 checksum of the first 68 characters of a TLE line"""
+    return sum(int(c) if c.isdigit() else c == '-' for c in line[:68]) % 10
+
+def checksum_ok(line):
+    return len(line) >= 69 and line[68].isdigit() and int(line[68]) == tle_checksum(line)
+
+def parse_tle_lines(lines):
+    """
+    Stream-parse 2-line or 3-line (name + 2 lines) TLE text.
+    Yields (name, line1, line2) tuples; name is None for 2-line entries.
+    """
+    name = None
+    line1 = None
+    for number, raw in enumerate(lines, 1):
+        line = raw.rstrip()
+        if not line:
+            continue
+        if line.startswith('1 ') and line1 is None:
+            line1 = line
+        elif line.startswith('2 ') and line1 is not None:
+            if line[2:7] != line1[2:7]:
+                raise ValueError(f"line {number}: TLE line 2 is for {line[2:7]}, expected {line1[2:7]}")
+            yield name, line1, line
+            name = line1 = None
+        elif line1 is None:
+            name = line[2:].strip() if line.startswith('0 ') else line.strip()
+        else:
+            raise ValueError(f"line {number}: expected TLE line 2 after {line1[:7]!r}")
+
+def parse_catalog(lines, strict=False):
+    """
+    Parse TLE text into a TleCatalog. Checksums are always validated and
+    recorded per entry; with strict=True a bad checksum raises ValueError,
+    otherwise a warning is issued and the entry is kept.
+    """
+    rows = []
+    for name, line1, line2 in parse_tle_lines(lines):
+        valid = checksum_ok(line1) and checksum_ok(line2)
+        if strict and not valid:
+            raise ValueError(f"TLE checksum mismatch for satellite {line1[2:7]}")
+        rows.append((
+            line1[2:7], name or "", line1.encode(), line2.encode(),
+            float(line2[8:16]), float(line2[17:25]), float("0." + line2[26:33].strip()),
+            float(line2[34:42]), float(line2[43:51]), float(line2[52:63]), valid
+        ))
+    records = np.array(rows, dtype=CATALOG_DTYPE)
+    bad = int(np.count_nonzero(~records['checksum_ok']))
+    if bad:
+        warnings.warn(f"{bad} of {len(records)} TLE entries have missing or invalid checksums")
+    return TleCatalog(records)
+
+def load_catalog(path, cache_dir=DEFAULT_CACHE_DIR, strict=False):
+    """
+    Load a TLE file as a TleCatalog. The parsed array is cached on disk,
+    keyed by the file's path, size and modification time, and memory-mapped
+    on later runs so repeat loads skip parsing entirely.
+    """
+    stat = os.stat(path)
+    key = hashlib.sha256(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key}.npy") if cache_dir else None
+
+    if cache_path and os.path.exists(cache_path):
+        records = np.load(cache_path, mmap_mode='r')
+        if records.dtype == CATALOG_DTYPE and (not strict or records['checksum_ok'].all()):
+            return TleCatalog(records)
+
+    with open(path, 'r') as f:
+        catalog = parse_catalog(f, strict=strict)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, catalog.records)
+        os.replace(tmp_path, cache_path)
+    return catalog
+
+class TleCatalog:
+    """
+    Array-backed TLE catalog. Elements live in one structured NumPy array;
+    lookups by satellite ID and range queries on inclination or mean motion
+    use sorted index arrays built on first use, so selections are binary
+    searches rather than scans over Python objects.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def _sorted(self, field):
+        if field not in self._orders:
+            self._orders[field] = np.argsort(self.records[field], kind='stable')
+        order = self._orders[field]
+        return order, self.records[field][order]
+
+    @property
+    def sat_ids(self):
+        return [str(s) for s in self.records['sat_id']]
+
+    def index_of(self, sat_id):
+        """Row of a satellite by its 5-character catalog number, KeyError if absent"""
+        order, keys = self._sorted('sat_id')
+        i = np.searchsorted(keys, sat_id)
+        if i == len(keys) or keys[i] != sat_id:
+            raise KeyError(sat_id)
+        return int(order[i])
+
+    def select(self, inclination=None, mean_motion=None):
+        """
+        Rows whose elements fall inside every given (low, high) range,
+        inclusive, e.g. select(inclination=(59.5, 60.5)). Rows keep file order.
+        """
+        rows = None
+        for field, bounds in (('inclination', inclination), ('mean_motion', mean_motion)):
+            if bounds is None:
+                continue
+            order, keys = self._sorted(field)
+            lo = np.searchsorted(keys, bounds[0], side='left')
+            hi = np.searchsorted(keys, bounds[1], side='right')
+            matches = np.sort(order[lo:hi])
+            rows = matches if rows is None else np.intersect1d(rows, matches)
+        return np.arange(len(self.records)) if rows is None else rows
+
+    def subset(self, rows):
+        return TleCatalog(self.records[rows])
+
+    def tles(self):
+        """List of (line1, line2) string pairs in catalog order"""
+        return [(l1.decode(), l2.decode()) for l1, l2 in zip(self.records['line1'], self.records['line2'])]
+
+    def as_dict(self):
+        """{sat_id: [line1, line2]}, the layout the generator scripts use"""
+        return {sat_id: list(pair) for sat_id, pair in zip(self.sat_ids, self.tles())}
+
+    def satellites(self, ts):
+        """EarthSatellite objects, named Satellite_<sat_id> unless the file names them"""
+        return [
+            EarthSatellite(line1, line2, str(name) or f"Satellite_{sat_id}", ts)
+            for sat_id, name, (line1, line2) in zip(self.sat_ids, self.records['name'], self.tles())
+        ]
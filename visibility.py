@@ -0,0 +1,313 @@
+from skyfield.sgp4lib import theta_GMST1982
+from sgp4.api import SatrecArray
+from instrumentation import traced, count
+import numpy as np
+
+DAY_S = 86400.0
+
+def sgp4_times(t):
+    """
+    Split a skyfield Time array into the plain arrays SGP4 and the TEME ->
+    ITRS rotation need: Julian date, UTC day fraction and UT1 day fraction
+    """
+    # SGP4 expects UTC, same conversion skyfield uses in EarthSatellite
+    fraction = t.tai_fraction - t._leap_seconds() / DAY_S
+    jd, fraction, ut1_fraction = np.broadcast_arrays(t.whole, fraction, t.ut1_fraction)
+    return np.atleast_1d(jd), np.atleast_1d(fraction), np.atleast_1d(ut1_fraction)
+
+@traced("sgp4.propagate")
+def propagate_satrecs(satrecs, jd, fraction, ut1_fraction):
+    """
+    Propagate sgp4 Satrec objects over plain time arrays (see sgp4_times).
+    Returns ITRS positions in km, shape (satellite, time, 3); NaN on SGP4 errors.
+    """
+    errors, r_teme, _ = SatrecArray(satrecs).sgp4(jd, fraction)
+    count("sgp4 samples", errors.size)
+    r_teme[errors != 0] = np.nan
+    return teme_to_itrs(r_teme, jd, ut1_fraction)
+
+def propagate_itrs(satellites, t):
+    """
+    Propagate a list of EarthSatellite objects over a skyfield Time array
+    in a single SGP4 batch.
+    Returns Earth-fixed (ITRS) positions in km, shape (satellite, time, 3).
+    Samples where SGP4 reports an error are NaN.
+    """
+    return propagate_satrecs([sat.model for sat in satellites], *sgp4_times(t))
+
+def teme_to_itrs(r_teme, jd_ut1, fraction_ut1):
+    """
+    Rotate TEME positions into ITRS (polar motion ignored).
+    The time arrays broadcast against the leading axes of r_teme.
+    """
+    # TEME -> ITRS is a rotation about z by Greenwich mean sidereal time
+    theta, _ = theta_GMST1982(jd_ut1, fraction_ut1)
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+    r_itrs = np.empty_like(r_teme)
+    r_itrs[..., 0] = cos_t * r_teme[..., 0] + sin_t * r_teme[..., 1]
+    r_itrs[..., 1] = -sin_t * r_teme[..., 0] + cos_t * r_teme[..., 1]
+    r_itrs[..., 2] = r_teme[..., 2]
+    return r_itrs
+
+def station_geometry(station_objects):
+    """
+    Precompute ITRS positions (km) and local zenith unit vectors for a list
+    of wgs84 ground station positions. Stations are fixed to the Earth, so
+    this is done once and reused for every satellite and time step.
+    """
+    positions = np.array([station.itrs_xyz.km for station in station_objects])
+    lat = np.array([station.latitude.radians for station in station_objects])
+    lon = np.array([station.longitude.radians for station in station_objects])
+    zenith = np.column_stack([
+        np.cos(lat) * np.cos(lon),
+        np.cos(lat) * np.sin(lon),
+        np.sin(lat)
+    ])
+    return positions, zenith
+
+def geodetic_to_itrs(lat, lon, height_km=0.0, radius_km=6378.137, inverse_flattening=298.257223563):
+    """
+    ITRS positions (km) and local zenith unit vectors, shape (..., 3), for
+    geodetic latitudes and longitudes in degrees on the WGS84 ellipsoid that
+    wgs84.latlon() uses. The array counterpart of station_geometry for
+    point sets too large to build skyfield objects for.
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    f = 1.0 / inverse_flattening
+    e2 = 2.0 * f - f * f
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    N = radius_km / np.sqrt(1.0 - e2 * sin_lat * sin_lat)
+    zenith = np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), sin_lat], axis=-1)
+    positions = np.stack([
+        (N + height_km) * zenith[..., 0],
+        (N + height_km) * zenith[..., 1],
+        (N * (1.0 - e2) + height_km) * sin_lat
+    ], axis=-1)
+    return positions, zenith
+
+@traced("topocentric.elevation_angles")
+def elevation_angles(satellite_positions, station_positions, station_zenith):
+    """
+    Elevation angles in degrees above the horizon.
+    satellite_positions: ITRS km, shape (satellite, time, 3)
+    Returns an array of shape (satellite, station, time)
+    """
+    # |sat - station|^2 and (sat - station).zenith without building the
+    # full (satellite, station, time, 3) difference array
+    count("topocentric pairs", satellite_positions.shape[0] * satellite_positions.shape[1] * len(station_zenith))
+    sat_dot_zenith = satellite_positions @ station_zenith.T
+    sat_dot_station = satellite_positions @ station_positions.T
+    station_dot_zenith = np.einsum('ij,ij->i', station_positions, station_zenith)
+    station_norm2 = np.einsum('ij,ij->i', station_positions, station_positions)
+    sat_norm2 = np.einsum('stk,stk->st', satellite_positions, satellite_positions)
+
+    up = sat_dot_zenith - station_dot_zenith
+    distance = np.sqrt(sat_norm2[..., None] - 2 * sat_dot_station + station_norm2)
+    elevation = np.degrees(np.arcsin(np.clip(up / distance, -1.0, 1.0)))
+    return elevation.transpose(0, 2, 1)
+
+@traced("topocentric.pairwise")
+def pairwise_elevations(satellite_positions, station_positions, station_zenith):
+    """
+    Elevation angles in degrees for matched rows of satellite positions,
+    station positions and station zenith vectors, all shape (n, 3); the
+    sparse counterpart of elevation_angles for precomputed candidate pairs
+    """
+    count("topocentric pairs", len(satellite_positions))
+    line_of_sight = satellite_positions - station_positions
+    up = np.einsum('ij,ij->i', line_of_sight, station_zenith)
+    distance = np.linalg.norm(line_of_sight, axis=1)
+    return np.degrees(np.arcsin(np.clip(up / distance, -1.0, 1.0)))
+
+def footprint_half_angle(positions, min_elevation=10.0, radius_km=6356.752):
+    """
+    Earth central angle in degrees from the subsatellite direction to the
+    edge of the region that sees the satellite above min_elevation, for ITRS
+    positions (..., 3). The sphere defaults to the WGS84 polar radius, which
+    gives the widest cap, so culling with it never drops a ground point; the
+    tilt of the geodetic zenith (under 0.2 degrees) still needs a margin.
+    """
+    e = np.radians(min_elevation)
+    ratio = np.clip(radius_km / np.linalg.norm(positions, axis=-1) * np.cos(e), -1.0, 1.0)
+    return np.degrees(np.arccos(ratio) - e)
+
+def compute_elevations(satellites, station_objects, t, chunk_size=1024):
+    """
+    Elevation angle of every satellite from every ground station at every
+    time in `t`. Satellites are propagated in chunks to bound memory.
+    Returns an array of shape (satellite, station, time) in degrees.
+    """
+    station_positions, station_zenith = station_geometry(station_objects)
+    elevations = np.empty((len(satellites), len(station_objects), len(np.atleast_1d(t.tt))))
+    for start in range(0, len(satellites), chunk_size):
+        chunk = satellites[start:start + chunk_size]
+        positions = propagate_itrs(chunk, t)
+        elevations[start:start + len(chunk)] = elevation_angles(positions, station_positions, station_zenith)
+    return elevations
+
+def is_visible(elevations, min_elevation=10.0):
+    """
+    Batched visibility mask for an array of elevation angles
+    min_elevation: minimum elevation angle in degrees (default 10°)
+    """
+    return elevations > min_elevation
+
+def time_offsets(t):
+    """
+    Split a Time array into a fixed SGP4 epoch (jd, UTC fraction, UT1
+    fraction of t[0]) and float second offsets, so arbitrary times inside
+    the window can be evaluated without building new Time objects
+    """
+    t0 = t[0]
+    epoch = (t0.whole, t0.tai_fraction - t0._leap_seconds() / DAY_S, t0.ut1_fraction)
+    offsets = (t.tt - t0.tt) * DAY_S
+    return epoch, offsets
+
+def propagate_at(satrecs, sat_index, epoch, seconds):
+    """
+    SGP4 TEME position (km) and velocity (km/s) for arbitrary (satellite,
+    time) pairs, times given as seconds from `epoch` (see time_offsets).
+    Each satellite is propagated once for all of its requested times.
+    """
+    jd, fraction, _ = epoch
+    r_teme = np.full((len(seconds), 3), np.nan)
+    v_teme = np.full((len(seconds), 3), np.nan)
+    for s in np.unique(sat_index):
+        rows = np.flatnonzero(sat_index == s)
+        fr = fraction + seconds[rows] / DAY_S
+        errors, r, v = satrecs[s].sgp4_array(np.full(len(rows), jd), fr)
+        r[errors != 0] = np.nan
+        r_teme[rows] = r
+        v_teme[rows] = v
+    return r_teme, v_teme
+
+def _pair_elevations(satrecs, station_positions, station_zenith, epoch, sat_index, station_index, seconds):
+    """
+    Elevation in degrees for arbitrary (satellite, station, time) triples
+    """
+    jd, _, ut1_fraction = epoch
+    r_teme, _ = propagate_at(satrecs, sat_index, epoch, seconds)
+    r_itrs = teme_to_itrs(r_teme, jd, ut1_fraction + seconds / DAY_S)
+
+    rho = r_itrs - station_positions[station_index]
+    up = np.einsum('ij,ij->i', rho, station_zenith[station_index])
+    distance = np.linalg.norm(rho, axis=1)
+    return np.degrees(np.arcsin(np.clip(up / distance, -1.0, 1.0)))
+
+@traced("passes.find")
+def find_passes(satellites, station_objects, t, min_elevation=10.0, tolerance_seconds=1.0, positions=None):
+    """
+    Event-based pass finder. The evenly spaced Time grid `t` is only used to
+    bracket horizon crossings; AOS and LOS are then refined by bisection and
+    the time of max elevation by golden-section search, all vectorized over
+    every pass at once. Passes entirely shorter than one grid step can be missed.
+    Passes already in progress at either end of the window are clipped to it.
+    positions: optional precomputed ITRS positions on `t` (e.g. from the
+    ephemeris cache); propagated here otherwise.
+    min_elevation: degrees, a scalar or one mask per station.
+    Returns a record array with fields sat, station, aos, tca, max_elevation
+    and los; times are seconds from t[0].
+    """
+    station_positions, station_zenith = station_geometry(station_objects)
+    if positions is None:
+        elevations = compute_elevations(satellites, station_objects, t)
+    else:
+        elevations = elevation_angles(positions, station_positions, station_zenith)
+    epoch, offsets = time_offsets(t)
+    num_times = len(offsets)
+    satrecs = [sat.model for sat in satellites]
+    station_mask = np.broadcast_to(np.asarray(min_elevation, dtype=float), (len(station_objects),))
+
+    def elevation_at(sat_index, station_index, seconds):
+        return _pair_elevations(satrecs, station_positions, station_zenith, epoch,
+                                sat_index, station_index, seconds)
+
+    # Runs of consecutive visible samples, one per pass
+    above = is_visible(elevations, station_mask[:, None])
+    padded = np.zeros(above.shape[:2] + (num_times + 2,), dtype=np.int8)
+    padded[..., 1:-1] = above
+    edges = np.diff(padded, axis=-1)
+    sat_index, station_index, first = np.nonzero(edges == 1)
+    _, _, end = np.nonzero(edges == -1)
+
+    # Refine horizon crossings between the last sample below and first above
+    def refine_crossing(grid_before, at_window_edge):
+        todo = ~at_window_edge
+        lo = offsets[grid_before[todo]]
+        hi = offsets[grid_before[todo] + 1]
+        s, g = sat_index[todo], station_index[todo]
+        lo_above = elevation_at(s, g, lo) > station_mask[g]
+        while len(lo) and np.max(hi - lo) > tolerance_seconds:
+            mid = 0.5 * (lo + hi)
+            same = (elevation_at(s, g, mid) > station_mask[g]) == lo_above
+            lo = np.where(same, mid, lo)
+            hi = np.where(same, hi, mid)
+        crossing = np.empty(len(grid_before))
+        crossing[todo] = 0.5 * (lo + hi)
+        return crossing
+
+    aos = refine_crossing(first - 1, first == 0)
+    los = refine_crossing(end - 1, end == num_times)
+    aos[first == 0] = offsets[0]
+    los[end == num_times] = offsets[-1]
+
+    # Golden-section search for max elevation around the best grid sample
+    pass_elevations = np.where(
+        (np.arange(num_times) >= first[:, None]) & (np.arange(num_times) < end[:, None]),
+        elevations[sat_index, station_index],
+        -np.inf
+    )
+    peak = np.argmax(pass_elevations, axis=1)
+    grid_max = pass_elevations[np.arange(len(peak)), peak]
+    lo = np.maximum(offsets[np.clip(peak - 1, 0, num_times - 1)], aos)
+    hi = np.minimum(offsets[np.clip(peak + 1, 0, num_times - 1)], los)
+    ratio = (np.sqrt(5) - 1) / 2
+    while len(lo) and np.max(hi - lo) > tolerance_seconds:
+        a = hi - ratio * (hi - lo)
+        b = lo + ratio * (hi - lo)
+        a_higher = elevation_at(sat_index, station_index, a) > elevation_at(sat_index, station_index, b)
+        hi = np.where(a_higher, b, hi)
+        lo = np.where(a_higher, lo, a)
+    tca = 0.5 * (lo + hi)
+    max_elevation = elevation_at(sat_index, station_index, tca)
+    use_grid = ~(max_elevation >= grid_max)
+    tca[use_grid] = offsets[peak[use_grid]]
+    max_elevation[use_grid] = grid_max[use_grid]
+
+    passes = np.zeros(len(sat_index), dtype=[
+        ('sat', np.int32), ('station', np.int32), ('aos', np.float64),
+        ('tca', np.float64), ('max_elevation', np.float64), ('los', np.float64)
+    ])
+    passes['sat'] = sat_index
+    passes['station'] = station_index
+    passes['aos'] = aos
+    passes['tca'] = tca
+    passes['max_elevation'] = max_elevation
+    passes['los'] = los
+    order = np.lexsort((passes['aos'], passes['sat'], passes['station']))
+    return passes[order]
+
+@traced("geodetic.itrs_to_geodetic")
+def itrs_to_geodetic(positions, radius_km=6378.1366, inverse_flattening=298.25642):
+    """
+    Convert ITRS positions in km (..., 3) to longitude and latitude in degrees
+    and height in km. Defaults to the IERS2010 ellipsoid used by skyfield's
+    `.subpoint()`, so results match the per-sample code they replace.
+    """
+    count("geodetic conversions", positions[..., 0].size)
+    f = 1.0 / inverse_flattening
+    e2 = 2.0 * f - f * f
+    x, y, z = positions[..., 0], positions[..., 1], positions[..., 2]
+    R = np.sqrt(x * x + y * y)
+    lat = np.arctan2(z, R)
+    for _ in range(3):
+        e2_sin_lat = e2 * np.sin(lat)
+        aC = radius_km / np.sqrt(1.0 - e2_sin_lat * np.sin(lat))
+        hyp = z + aC * e2_sin_lat
+        lat = np.arctan2(hyp, R)
+    lon = (np.arctan2(y, x) - np.pi) % (2 * np.pi) - np.pi
+    height = np.sqrt(hyp * hyp + R * R) - aC
+    return np.degrees(lon), np.degrees(lat), height
@@ -0,0 +1,237 @@
+from skyfield.api import load, utc
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from parallel_propagation import propagate_tles
+from tle_catalog import load_catalog
+from time_window import TIMESTAMP_FORMAT, DEFAULT_STATION_FILE
+from station_registry import load_stations
+from visibility import sgp4_times, propagate_satrecs, elevation_angles, find_passes, itrs_to_geodetic
+import numpy as np
+import argparse
+import asyncio
+import threading
+import json
+import time
+
+# Longest pass search a query may ask for; each hour is held in the ephemeris LRU
+MAX_QUERY_HOURS = 7 * 24.0
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+class QueryError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class WarmState:
+    """
+    Everything the scripts rebuild on every run, built once: the timescale,
+    the parsed catalog and its EarthSatellite objects, station geometry, and
+    a small LRU of whole-catalog ephemerides on the pass-search grid.
+    """
+
+    def __init__(self, tle_file, station_file=DEFAULT_STATION_FILE, pass_step_minutes=10, max_ephemerides=4):
+        self.ts = load.timescale()
+        self.catalog = load_catalog(tle_file)
+        self.satellites = self.catalog.satellites(self.ts)
+        self.tles = self.catalog.tles()
+        self.sat_index = {sat_id: i for i, sat_id in enumerate(self.catalog.sat_ids)}
+        self.stations = load_stations(station_file)
+        self.station_ids = self.stations.ids
+        self.station_objects = self.stations.topos()
+        self.pass_step = timedelta(minutes=pass_step_minutes)
+        self.max_ephemerides = max_ephemerides
+        self._ephemerides = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sat(self, sat_id):
+        if sat_id not in self.sat_index:
+            raise QueryError(404, f"unknown satellite {sat_id!r}")
+        return self.sat_index[sat_id]
+
+    def station(self, station_id):
+        try:
+            return self.stations.index_of(station_id)
+        except KeyError:
+            raise QueryError(404, f"unknown station {station_id!r}")
+
+    def _positions_at(self, s, when):
+        t = self.ts.from_datetimes([when])
+        return propagate_satrecs([self.satellites[s].model], *sgp4_times(t))
+
+    def position(self, sat_id, when):
+        positions = self._positions_at(self.sat(sat_id), when)
+        lon, lat, height = itrs_to_geodetic(positions)
+        return {
+            "sat": sat_id,
+            "time": when.strftime(TIMESTAMP_FORMAT),
+            "itrs_km": [float(x) for x in positions[0, 0]],
+            "longitude": float(lon[0, 0]),
+            "latitude": float(lat[0, 0]),
+            "height_km": float(height[0, 0])
+        }
+
+    def visibility(self, sat_id, station_id, when, min_elevation=None):
+        g = self.station(station_id)
+        if min_elevation is None:
+            min_elevation = float(self.stations.min_elevation[g])
+        elevations = elevation_angles(self._positions_at(self.sat(sat_id), when),
+                                      self.stations.positions[g:g + 1], self.stations.zenith[g:g + 1])
+        elevation = float(elevations[0, 0, 0])
+        return {
+            "sat": sat_id,
+            "station": station_id,
+            "time": when.strftime(TIMESTAMP_FORMAT),
+            "elevation": elevation,
+            "visible": bool(elevation > min_elevation)
+        }
+
+    def ephemeris(self, start, hours):
+        """Whole-catalog positions on the pass grid from start, kept warm between queries"""
+        key = (start, hours)
+        with self._lock:
+            if key in self._ephemerides:
+                self._ephemerides.move_to_end(key)
+                return self._ephemerides[key]
+            steps = int(timedelta(hours=hours) / self.pass_step) + 1
+            t = self.ts.from_datetimes([start + i * self.pass_step for i in range(steps)])
+            self._ephemerides[key] = (t, propagate_tles(self.tles, t))
+            while len(self._ephemerides) > self.max_ephemerides:
+                self._ephemerides.popitem(last=False)
+            return self._ephemerides[key]
+
+    def next_passes(self, sat_id, station_id, when, hours, min_elevation=None):
+        s, g = self.sat(sat_id), self.station(station_id)
+        if min_elevation is None:
+            min_elevation = float(self.stations.min_elevation[g])
+        # Floor to the grid so queries within one step share an ephemeris
+        start = when - (when - datetime(1970, 1, 1, tzinfo=utc)) % self.pass_step
+        t, positions = self.ephemeris(start, hours)
+        passes = find_passes([self.satellites[s]], [self.station_objects[g]], t,
+                             min_elevation=min_elevation, positions=positions[s:s + 1])
+        passes = passes[np.argsort(passes['aos'])]
+
+        def timestamp(seconds):
+            return (start + timedelta(seconds=round(float(seconds)))).strftime(TIMESTAMP_FORMAT)
+
+        return {
+            "sat": sat_id,
+            "station": station_id,
+            "passes": [
+                {
+                    "aos": timestamp(p['aos']),
+                    "tca": timestamp(p['tca']),
+                    "max_elevation": float(p['max_elevation']),
+                    "los": timestamp(p['los'])
+                }
+                for p in passes if start + timedelta(seconds=float(p['los'])) > when
+            ]
+        }
+
+def _query_time(query):
+    if "time" not in query:
+        return datetime.now(tz=utc)
+    try:
+        return datetime.strptime(query["time"], TIMESTAMP_FORMAT).replace(tzinfo=utc)
+    except ValueError:
+        raise QueryError(400, f"time must be formatted as {TIMESTAMP_FORMAT}")
+
+def _query_float(query, name, default):
+    if name not in query:
+        return default
+    try:
+        value = float(query[name])
+    except ValueError:
+        raise QueryError(400, f"{name} must be a number")
+    if not np.isfinite(value):
+        raise QueryError(400, f"{name} must be finite")
+    return value
+
+def _query_hours(query, default=24.0):
+    hours = _query_float(query, "hours", default)
+    if not 0 < hours <= MAX_QUERY_HOURS:
+        raise QueryError(400, f"hours must be greater than 0 and at most {MAX_QUERY_HOURS:g}")
+    return hours
+
+def _required(query, name):
+    if name not in query:
+        raise QueryError(400, f"missing parameter {name!r}")
+    return query[name]
+
+async def answer(state, path, query):
+    """Dispatch one GET request; pass searches run in a worker thread"""
+    if path == "/health":
+        return {"satellites": len(state.satellites), "stations": len(state.station_ids)}
+    if path == "/position":
+        return state.position(_required(query, "sat"), _query_time(query))
+    if path == "/visibility":
+        return state.visibility(_required(query, "sat"), _required(query, "station"), _query_time(query),
+                                _query_float(query, "min_elevation", None))
+    if path == "/passes":
+        return await asyncio.to_thread(
+            state.next_passes, _required(query, "sat"), _required(query, "station"), _query_time(query),
+            _query_hours(query), _query_float(query, "min_elevation", None)
+        )
+    raise QueryError(404, f"no such endpoint {path!r}")
+
+async def handle_connection(state, reader, writer):
+    """Minimal HTTP/1.1: one GET per connection, JSON response"""
+    try:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        began = time.perf_counter()
+        try:
+            if len(request_line) < 2:
+                raise QueryError(400, "malformed request line")
+            if request_line[0] != "GET":
+                raise QueryError(405, "only GET is supported")
+            url = urlsplit(request_line[1])
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            status, body = 200, await answer(state, url.path, query)
+        except QueryError as e:
+            status, body = e.status, {"error": str(e)}
+        except Exception as e:
+            status, body = 500, {"error": repr(e)}
+        body["elapsed_ms"] = round((time.perf_counter() - began) * 1000, 3)
+        payload = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def serve(state, host, port, unix_path=None):
+    def handler(reader, writer):
+        return handle_connection(state, reader, writer)
+
+    if unix_path:
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+        print(f"Serving visibility queries on unix socket {unix_path}")
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        print(f"Serving visibility queries on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Long-running visibility, position and next-pass query service",
+        epilog="e.g. curl 'http://127.0.0.1:8765/visibility?sat=00007&station=Europe'"
+    )
+    parser.add_argument("--tle-file", default="satellite_tles.txt")
+    parser.add_argument("--station-file", default=DEFAULT_STATION_FILE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--pass-step-minutes", type=float, default=10,
+                        help="grid used to bracket horizon crossings for /passes")
+    args = parser.parse_args()
+
+    state = WarmState(args.tle_file, args.station_file, pass_step_minutes=args.pass_step_minutes)
+    try:
+        asyncio.run(serve(state, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,162 @@
+from skyfield.api import utc
+from datetime import datetime, timedelta
+from instrumentation import traced, count
+import numpy as np
+import argparse
+import struct
+import zipfile
+import json
+import os
+
+SAMPLE_DTYPE = np.dtype([
+    ('station', np.uint16),
+    ('sat', np.uint32),
+    ('time', np.int32),       # seconds from the epoch
+    ('elevation', np.float32)
+])
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+def write_visibility(path, station_ids, sat_ids, start_time, offsets, elevations, visible):
+    """
+    Write visible samples as a columnar, uncompressed NPZ file.
+    elevations and visible have shape (satellite, station, time) and offsets
+    holds the sample times in seconds from start_time.
+    """
+    sat_index, station_index, time_index = np.nonzero(visible)
+    write_contacts(path, station_ids, sat_ids, start_time, offsets,
+                   (sat_index, station_index, time_index, elevations[sat_index, station_index, time_index]))
+
+def write_contacts(path, station_ids, sat_ids, start_time, offsets, contacts):
+    """
+    Same as write_visibility for sparse (sat, station, time index,
+    elevation) arrays, e.g. from StationRegistry.contacts
+    """
+    sat_index, station_index, time_index, elevation = contacts
+    samples = np.zeros(len(sat_index), dtype=SAMPLE_DTYPE)
+    samples['station'] = station_index
+    samples['sat'] = sat_index
+    samples['time'] = np.round(np.asarray(offsets)[time_index]).astype(np.int32)
+    samples['elevation'] = elevation
+    write_samples(path, station_ids, sat_ids, start_time, samples)
+
+@traced("visibility_store.write")
+def write_samples(path, station_ids, sat_ids, start_time, samples):
+    """
+    Write a SAMPLE_DTYPE array as a columnar, uncompressed NPZ file. Rows are
+    sorted by (station, satellite, time) and `pair_start` holds CSR offsets,
+    so the rows of station g and satellite s are pair_start[g * n_sat + s]
+    up to the next entry.
+    """
+    samples = samples[np.lexsort((samples['time'], samples['sat'], samples['station']))]
+
+    pair = samples['station'].astype(np.int64) * len(sat_ids) + samples['sat']
+    pair_start = np.searchsorted(pair, np.arange(len(station_ids) * len(sat_ids) + 1)).astype(np.int64)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            samples=samples,
+            pair_start=pair_start,
+            station_ids=np.array(station_ids, dtype=str),
+            sat_ids=np.array(sat_ids, dtype=str),
+            epoch=np.array([start_time.strftime(TIMESTAMP_FORMAT)])
+        )
+    count("visibility bytes written", os.path.getsize(tmp_path))
+    os.replace(tmp_path, path)
+
+def _mmap_npz(path):
+    """
+    Memory-map every member of an uncompressed .npz (as written by np.savez)
+    in place, instead of reading them out of the archive
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed and cannot be memory-mapped")
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if 0 in shape:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(),
+                                         shape=shape, order='F' if fortran_order else 'C')
+    return arrays
+
+class VisibilityStore:
+    """
+    Reader for columnar visibility files. Columns are memory-mapped, so
+    opening is constant-time and filtering by station or satellite only
+    touches the rows for that selection.
+    """
+
+    def __init__(self, path):
+        arrays = _mmap_npz(path)
+        self.samples = arrays['samples']
+        self.pair_start = arrays['pair_start']
+        self.station_ids = [str(s) for s in arrays['station_ids']]
+        self.sat_ids = [str(s) for s in arrays['sat_ids']]
+        self.epoch = datetime.strptime(str(arrays['epoch'][0]), TIMESTAMP_FORMAT).replace(tzinfo=utc)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def _pair_slice(self, station_index, sat_index):
+        pair = station_index * len(self.sat_ids) + sat_index
+        return slice(int(self.pair_start[pair]), int(self.pair_start[pair + 1]))
+
+    def rows(self, station=None, sat=None):
+        """Samples for a station ID and/or satellite ID, sorted by (station, satellite, time)"""
+        if station is None and sat is None:
+            return self.samples
+        n_sat = len(self.sat_ids)
+        if station is not None:
+            g = self.station_ids.index(station)
+            if sat is not None:
+                return self.samples[self._pair_slice(g, self.sat_ids.index(sat))]
+            return self.samples[int(self.pair_start[g * n_sat]):int(self.pair_start[(g + 1) * n_sat])]
+        s = self.sat_ids.index(sat)
+        return np.concatenate([self.samples[self._pair_slice(g, s)] for g in range(len(self.station_ids))])
+
+    def timestamps(self, rows):
+        return [(self.epoch + timedelta(seconds=int(t))).strftime(TIMESTAMP_FORMAT) for t in rows['time']]
+
+    def to_json_dict(self):
+        """Nested {station: {satellite: [{timestamp, elevation}]}} layout of visibility_data.json"""
+        data = {}
+        for g, station_id in enumerate(self.station_ids):
+            data[station_id] = {}
+            for s, sat_id in enumerate(self.sat_ids):
+                rows = self.samples[self._pair_slice(g, s)]
+                data[station_id][sat_id] = [
+                    {'timestamp': timestamp, 'elevation': float(elevation)}
+                    for timestamp, elevation in zip(self.timestamps(rows), rows['elevation'])
+                ]
+        return data
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or export a columnar visibility file")
+    parser.add_argument("path", nargs="?", default="visibility_data.npz")
+    parser.add_argument("--station", help="only rows for this station ID")
+    parser.add_argument("--sat", help="only rows for this satellite ID")
+    parser.add_argument("--export-json", metavar="FILE", help="write the visibility_data.json layout")
+    args = parser.parse_args()
+
+    store = VisibilityStore(args.path)
+    if args.export_json:
+        with open(args.export_json, 'w') as f:
+            json.dump(store.to_json_dict(), f, indent=2)
+        print(f"Visibility data has been exported to '{args.export_json}'")
+    else:
+        rows = store.rows(args.station, args.sat)
+        for row, timestamp in zip(rows, store.timestamps(rows)):
+            print(f"{store.station_ids[row['station']]},{store.sat_ids[row['sat']]},{timestamp},{row['elevation']:.2f}")